@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Which vector backend logic.search_query runs against: "chroma" or "faiss"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Fuse BM25 with the dense results, and how many candidates each side contributes per requested result
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# FAISS settings
+FAISS_INDEX_FILE = "data/faiss_index.idx"
+FAISS_METADATA_FILE = "data/faiss_metadata.json"
+# Version of the saved index on its own, so checking it does not parse the sidecar
+FAISS_VERSION_FILE = "data/faiss_version.txt"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw")  # flat, hnsw or ivf
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "256"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() in ("1", "true", "yes")
+
+
+class VectorBackend:
+    """
+    Interface logic.search_query searches through. It mirrors the subset of the
+    ChromaDB collection API the app uses, so results keep Chroma's shape:
+    {"ids", "documents", "metadatas", "distances"}, one list per query embedding.
+    Distances are squared L2 on unit vectors (smaller is closer).
+    """
+
+    name = ""
+
+    def query(self, query_embeddings, n_results=3, query_texts=None):
+        """query_texts carries the raw questions for backends that need them (hybrid)"""
+        raise NotImplementedError
+
+    async def aquery(self, query_embeddings, n_results=3, query_texts=None):
+        """
+        Async query. The embedded Chroma client and FAISS have no native async API,
+        so the search runs in a worker thread (FAISS releases the GIL while searching).
+        """
+        return await asyncio.to_thread(self.query, query_embeddings, n_results, query_texts)
+
+    def count(self):
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """Thin wrapper around a ChromaDB collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    def query(self, query_embeddings, n_results=3, query_texts=None):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+    def count(self):
+        return self.collection.count()
+
+
+class ShardedBackend(VectorBackend):
+    """
+    Searches a vectorstore.ShardedCollection, only in the shards a
+    routing.QueryRouter picks for each question. Questions routed to the same
+    shards are searched together in one multi-query call.
+    """
+
+    def __init__(self, collection, router=None):
+        self.collection = collection
+        self.router = router
+        self.name = collection.name
+
+    def route(self, query_embeddings, query_texts=None):
+        """Shards to search per question (None searches all of them)"""
+        if self.router is None:
+            return [None] * len(query_embeddings)
+        query_texts = query_texts or [None] * len(query_embeddings)
+        return [self.router.route(query_text, query_embedding)
+                for query_text, query_embedding in zip(query_texts, query_embeddings)]
+
+    def query(self, query_embeddings, n_results=3, query_texts=None, routes=None):
+        routes = routes or self.route(query_embeddings, query_texts)
+        groups = {}
+        for row, shards in enumerate(routes):
+            groups.setdefault(tuple(shards) if shards else None, []).append(row)
+
+        results = {key: [None] * len(query_embeddings) for key in ("ids", "documents", "metadatas", "distances")}
+        for shards, rows in groups.items():
+            group = self.collection.query([query_embeddings[row] for row in rows], n_results, shards=shards)
+            for i, row in enumerate(rows):
+                for key in results:
+                    results[key][row] = group[key][i]
+        return results
+
+    def count(self):
+        return self.collection.count()
+
+
+class FaissBackend(VectorBackend):
+    """
+    FAISS index over normalized embeddings searched by inner product, with a
+    JSON sidecar mapping FAISS row IDs to chunk IDs, texts and metadata.
+    """
+
+    def __init__(self, index, chunks, version="", index_type=FAISS_INDEX_TYPE):
+        self.index = index
+        self.chunks = chunks
+        self.version = version
+        self.index_type = index_type
+        self.name = f"faiss_{index_type}"
+        self._configure_search()
+
+    def _configure_search(self):
+        import faiss
+        if self.index_type == "hnsw":
+            faiss.downcast_index(self.index).hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+        elif self.index_type == "ivf":
+            faiss.extract_index_ivf(self.index).nprobe = FAISS_IVF_NPROBE
+
+    @staticmethod
+    def create_index(dimension, index_type=FAISS_INDEX_TYPE, num_vectors=0):
+        """Returns an empty inner-product index of the requested type"""
+        import faiss
+        if index_type == "flat":
+            return faiss.IndexFlatIP(dimension)
+        if index_type == "hnsw":
+            return faiss.IndexHNSWFlat(dimension, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        if index_type == "ivf":
+            # FAISS wants roughly 39 training points per list
+            nlist = max(1, min(FAISS_IVF_NLIST, num_vectors // 39))
+            quantizer = faiss.IndexFlatIP(dimension)
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    @classmethod
+    def build(cls, chunk_iter, encode, index_type=FAISS_INDEX_TYPE, version="", batch_size=256):
+        """
+        Builds an index from (chunk_id, text, metadata) tuples.
+
+        Args:
+            chunk_iter (iterable): Chunks to index.
+            encode (callable): list[str] -> 2-D numpy array of embeddings.
+            index_type (str): "flat", "hnsw" or "ivf".
+            version (str): Data version recorded in the sidecar.
+            batch_size (int): Chunks encoded per call.
+        """
+        def batches():
+            batch = []
+            for item in chunk_iter:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield batch, encode([text for _, text, _ in batch])
+                    batch = []
+            if batch:
+                yield batch, encode([text for _, text, _ in batch])
+
+        return cls.from_vectors(batches(), index_type, version)
+
+    @classmethod
+    def from_vectors(cls, batches, index_type=FAISS_INDEX_TYPE, version=""):
+        """
+        Builds an index from embeddings computed earlier, e.g. the ones stored
+        in a ChromaDB collection, without encoding anything.
+
+        Args:
+            batches (iterable): (list of (chunk_id, text, metadata), 2-D array of embeddings) pairs.
+            index_type (str): "flat", "hnsw" or "ivf".
+            version (str): Data version recorded in the sidecar.
+        """
+        import numpy as np
+        import faiss
+
+        start = time.time()
+        chunks = []
+        vectors = []
+        for batch, batch_vectors in batches:
+            chunks.extend(batch)
+            vectors.append(np.asarray(batch_vectors, dtype=np.float32))
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        faiss.normalize_L2(matrix)
+        index = cls.create_index(matrix.shape[1], index_type, len(matrix))
+        if not index.is_trained:
+            index.train(matrix)
+        index.add(matrix)
+
+        sidecar = [
+            {"id": chunk_id, "text": text, "metadata": metadata}
+            for chunk_id, text, metadata in chunks
+        ]
+        print(f"✅ Built FAISS {index_type} index with {index.ntotal} vectors in {time.time() - start:.2f}s")
+        return cls(index, sidecar, version, index_type)
+
+    def save(self, index_path=FAISS_INDEX_FILE, metadata_path=FAISS_METADATA_FILE, version_path=FAISS_VERSION_FILE):
+        import faiss
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        # The version file goes last, so it only ever names a complete index and sidecar
+        if os.path.exists(version_path):
+            os.remove(version_path)
+        # Replace rather than overwrite: a live index may be memory-mapping the old file
+        faiss.write_index(self.index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        tmp_path = metadata_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.version, "index_type": self.index_type, "chunks": self.chunks}, f, ensure_ascii=False)
+        os.replace(tmp_path, metadata_path)
+        with open(version_path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(self.version)
+        os.replace(version_path + ".tmp", version_path)
+
+    @classmethod
+    def load(cls, index_path=FAISS_INDEX_FILE, metadata_path=FAISS_METADATA_FILE, mmap=FAISS_MMAP):
+        """
+        Loads a saved index and its sidecar. With mmap=True the vectors are
+        memory-mapped instead of read into RAM where the index type allows it.
+        """
+        import faiss
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                print(f"⚠️ Memory-mapped FAISS load failed, reading into memory: {e}")
+        if index is None:
+            index = faiss.read_index(index_path)
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        return cls(index, sidecar["chunks"], sidecar.get("version", ""), sidecar.get("index_type", FAISS_INDEX_TYPE))
+
+    def query(self, query_embeddings, n_results=3, query_texts=None):
+        import numpy as np
+        import faiss
+
+        queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        faiss.normalize_L2(queries)
+        scores, positions = self.index.search(queries, n_results)
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row_scores, row_positions in zip(scores, positions):
+            hits = [(score, self.chunks[pos]) for score, pos in zip(row_scores, row_positions) if pos >= 0]
+            results["ids"].append([chunk["id"] for _, chunk in hits])
+            results["documents"].append([chunk["text"] for _, chunk in hits])
+            results["metadatas"].append([chunk["metadata"] for _, chunk in hits])
+            # Squared L2 between unit vectors, comparable with Chroma's default metric
+            results["distances"].append([float(2 - 2 * score) for score, _ in hits])
+        return results
+
+    def count(self):
+        return self.index.ntotal
+
+
+class HybridBackend(VectorBackend):
+    """
+    Dense backend plus a lexical.BM25Index, fused with reciprocal rank fusion.
+    Catches exact-term questions (policy numbers, form names, dollar amounts)
+    that MiniLM embeddings miss. Chunks found only by BM25 have no distance and
+    get None. Over a ShardedBackend, BM25 hits outside a question's routed
+    shards are dropped.
+    """
+
+    def __init__(self, dense, bm25, candidates=HYBRID_CANDIDATES, rrf_k=RRF_K):
+        self.dense = dense
+        self.bm25 = bm25
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.name = f"hybrid_{dense.name}"
+
+    def query(self, query_embeddings, n_results=3, query_texts=None):
+        from lexical import reciprocal_rank_fusion
+
+        n_candidates = n_results * self.candidates
+        routes = None
+        if isinstance(self.dense, ShardedBackend):
+            routes = self.dense.route(query_embeddings, query_texts)
+            dense_results = self.dense.query(query_embeddings, n_candidates, query_texts, routes=routes)
+        else:
+            dense_results = self.dense.query(query_embeddings, n_candidates)
+        if not query_texts:
+            return {key: [row[:n_results] for row in dense_results[key]]
+                    for key in ("ids", "documents", "metadatas", "distances")}
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row, query_text in enumerate(query_texts):
+            dense_hits = {
+                chunk_id: (text, metadata, distance)
+                for chunk_id, text, metadata, distance in zip(
+                    dense_results["ids"][row], dense_results["documents"][row],
+                    dense_results["metadatas"][row], dense_results["distances"][row])
+            }
+            lexical_ids = [chunk_id for chunk_id, _ in self.bm25.search(query_text, n_candidates)]
+            if routes and routes[row]:
+                lexical_ids = [chunk_id for chunk_id in lexical_ids
+                               if self.bm25.chunks[chunk_id][1].get("source") in routes[row]]
+            fused = reciprocal_rank_fusion([dense_results["ids"][row], lexical_ids], self.rrf_k)[:n_results]
+
+            ids, documents, metadatas, distances = [], [], [], []
+            for chunk_id, _ in fused:
+                if chunk_id in dense_hits:
+                    text, metadata, distance = dense_hits[chunk_id]
+                else:
+                    (text, metadata), distance = self.bm25.chunks[chunk_id], None
+                ids.append(chunk_id)
+                documents.append(text)
+                metadatas.append(metadata)
+                distances.append(distance)
+            results["ids"].append(ids)
+            results["documents"].append(documents)
+            results["metadatas"].append(metadatas)
+            results["distances"].append(distances)
+        return results
+
+    def count(self):
+        return self.dense.count()
+
+
+class SwappableBackend(VectorBackend):
+    """
+    Stable handle on the live backend. swap() replaces it with a single
+    reference assignment, so a query sees either the old or the new index in
+    full, and queries already running finish on the one they started with.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def name(self):
+        # Part of the retrieval cache key, so a swap also retires cached results
+        return self._backend.name if self._backend is not None else ""
+
+    def swap(self, backend):
+        self._backend = backend
+
+    def _current(self):
+        backend = self._backend
+        if backend is None:
+            raise RuntimeError("No search index has been loaded yet")
+        return backend
+
+    def query(self, query_embeddings, n_results=3, query_texts=None):
+        return self._current().query(query_embeddings, n_results, query_texts)
+
+    async def aquery(self, query_embeddings, n_results=3, query_texts=None):
+        return await self._current().aquery(query_embeddings, n_results, query_texts)
+
+    def count(self):
+        return self._current().count()
+
+
+def read_faiss_version(version_path=FAISS_VERSION_FILE):
+    """Data version of the saved FAISS index, or None if there is no complete index"""
+    try:
+        with open(version_path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
@@ -0,0 +1,148 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+from dotenv import load_dotenv
+import logic
+import llm
+from llm import LLMOverloadedError
+
+load_dotenv()
+
+DEFAULT_LANGUAGE = "English"
+# Questions retrieved per multi-query search; bounds memory for large files
+BATCH_SEARCH_SIZE = int(os.getenv("BATCH_SEARCH_SIZE", "64"))
+
+
+def load_questions(path, default_language=DEFAULT_LANGUAGE):
+    """
+    Reads questions from a .jsonl file ({"id", "question", "language"}) or a
+    .csv file with question and optional id / language columns.
+
+    Returns:
+        list[dict]: {"id", "question", "language"} per question.
+    """
+    if path.endswith(".csv"):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    for i, row in enumerate(rows):
+        question = (row.get("question") or "").strip()
+        if not question:
+            continue
+        questions.append({
+            "id": row.get("id") or str(i),
+            "question": question,
+            "language": row.get("language") or default_language,
+        })
+    return questions
+
+
+async def answer_batch(questions, collection, top_k=3, concurrency=None, retrieve_only=False, on_result=None):
+    """
+    Answers many questions at once.
+
+    Retrieval is batched: all queries are embedded in one encode call and
+    searched with one multi-query collection.query per BATCH_SEARCH_SIZE
+    questions. LLM calls then run concurrently, at most `concurrency` at a
+    time, and still go through the shared TPM/RPM limiter.
+
+    Args:
+        questions (list[dict]): {"id", "question", "language"} as from load_questions.
+        collection: ChromaDB collection or backends.VectorBackend.
+        top_k (int): Chunks retrieved per question.
+        concurrency (int, optional): Parallel LLM calls. Defaults to LLM_MAX_CONCURRENCY.
+        retrieve_only (bool): Skip the LLM and only report the retrieved titles.
+        on_result (callable, optional): Called with each result dict as it completes.
+
+    Returns:
+        list[dict]: One result per question, in input order. "distances" lines
+            up with "titles"; with HYBRID_SEARCH a chunk found only by BM25 has
+            no vector distance and gets None (null in the JSONL output).
+            "usage" is the answer's token usage (see logic.generate_answer).
+    """
+    concurrency = concurrency or llm.LLM_MAX_CONCURRENCY
+    results = [None] * len(questions)
+
+    start = time.perf_counter()
+    searched = []
+    for offset in range(0, len(questions), BATCH_SEARCH_SIZE):
+        batch = questions[offset:offset + BATCH_SEARCH_SIZE]
+        searched.extend(await logic.asearch_queries([item["question"] for item in batch], collection, top_k))
+    print(f"🔎 Retrieved context for {len(questions)} questions in {time.perf_counter() - start:.2f}s")
+
+    # Bounds the number of calls waiting in the limiter so it never reports overload
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i):
+        item = questions[i]
+        titles, chunks, distances = searched[i]
+        result = {
+            "id": item["id"],
+            "question": item["question"],
+            "language": item["language"],
+            "titles": titles,
+            "distances": distances,
+            "answer": None,
+            "usage": None,
+            "error": None,
+        }
+        if not retrieve_only:
+            async with semaphore:
+                question_start = time.perf_counter()
+                try:
+                    response = await logic.agenerate_answer(item["question"], chunks, None, item["language"])
+                    result["answer"] = response.content
+                    result["usage"] = response.response_metadata.get("prompt_usage")
+                except LLMOverloadedError as e:
+                    result["error"] = f"overloaded: {e}"
+                except Exception as e:
+                    result["error"] = str(e)
+                result["latency_ms"] = round((time.perf_counter() - question_start) * 1000, 1)
+        results[i] = result
+        if on_result is not None:
+            on_result(result)
+
+    await asyncio.gather(*(answer(i) for i in range(len(questions))))
+    print(f"✅ Answered {len(questions)} questions in {time.perf_counter() - start:.2f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions in bulk and write JSONL results")
+    parser.add_argument("questions", help=".jsonl or .csv file of questions")
+    parser.add_argument("--output", default="data/batch_answers.jsonl")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="Language for rows without one")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=llm.LLM_MAX_CONCURRENCY)
+    # Answers go to the shared answer cache (ANSWER_CACHE_PATH), which pre-warms a
+    # running app; retrieval caches are per process, so --retrieve-only does not
+    parser.add_argument("--retrieve-only", action="store_true", help="Skip the LLM and only retrieve")
+    args = parser.parse_args()
+
+    import vectorstore
+    questions = load_questions(args.questions, args.language)
+    # Read-only: the app's IndexManager owns rebuilds and retiring old collections
+    collection = vectorstore.open_active_index()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        def write(result):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+
+        results = asyncio.run(answer_batch(questions, collection, args.top_k, args.concurrency,
+                                           args.retrieve_only, on_result=write))
+
+    errors = sum(1 for result in results if result["error"])
+    print(f"📄 Wrote {len(results)} results to {args.output} ({errors} errors)")
+
+
+if __name__ == "__main__":
+    main()
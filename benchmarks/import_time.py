@@ -0,0 +1,106 @@
+"""
+Import-time profile of the serving path.
+
+Runs `python -X importtime` on the modules app.py imports in a fresh
+interpreter, reports the slowest top-level imports and the total, and fails
+when a heavy dependency that should load lazily (torch, faiss, scraping and
+PDF libraries, the LLM client) is imported at startup or the total exceeds
+the budget.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 3000] [--top 15] [--output data/import_time.json]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What `import app` pulls in before the first question is asked
+SERVING_MODULES = ["logic", "embeddings", "vectorstore", "rerank", "llm"]
+
+# Must not be imported until first use
+LAZY_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "faiss",
+    "bs4",
+    "PyPDF2",
+    "langchain_groq",
+    "langchain.chains",
+    "langchain_text_splitters",
+    "onnxruntime",
+    "tokenizers",
+]
+
+
+def profile(modules):
+    """
+    Imports modules in a fresh interpreter with -X importtime.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) for every import, in load order.
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing the serving modules failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=3000, help="Max total import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    parser.add_argument("--output", default="data/import_time.json")
+    args = parser.parse_args()
+
+    rows = profile(SERVING_MODULES)
+    loaded = {name for name, _, _, _ in rows}
+    top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: row[2], reverse=True)
+    total_ms = sum(row[2] for row in rows if row[3] == 0) / 1000
+    eager = [module for module in LAZY_MODULES if module in loaded]
+
+    report = {
+        "modules": SERVING_MODULES,
+        "total_ms": round(total_ms, 1),
+        "budget_ms": args.budget_ms,
+        "eager_heavy_imports": eager,
+        "slowest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                    for name, _, cumulative, _ in top_level[:args.top]],
+    }
+    os.makedirs(os.path.dirname(os.path.join(ROOT, args.output)), exist_ok=True)
+    with open(os.path.join(ROOT, args.output), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for entry in report["slowest"]:
+        print(f"{entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+    print(f"⏱️ Serving imports took {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if eager:
+        print(f"❌ Imported eagerly, should load on first use: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("❌ Import time is over budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
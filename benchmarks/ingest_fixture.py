@@ -0,0 +1,143 @@
+"""
+Offline end-to-end check of ingest.run_ingestion against a local HTTP fixture.
+
+Serves three pages from an http.server on 127.0.0.1 and runs the ingestion
+three times against a temporary document store and state file:
+  1. first run: a plain 200 page, a page that answers 503 twice before 200
+     (exercises the session's retries) and a page that always answers 500
+  2. second run: the conditional GETs carry the saved ETag / Last-Modified and
+     both good pages answer 304, so nothing is written
+  3. third run: one page changes, so only that one is parsed and stored again
+
+Exits non-zero on the first failed check. Needs no network access.
+
+Usage:
+    python benchmarks/ingest_fixture.py
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest
+from docstore import DocumentStore
+
+LAST_MODIFIED = "Wed, 01 Oct 2025 12:00:00 GMT"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    /policies  200 with an ETag, 304 when If-None-Match matches
+    /flaky     503 for the first two requests, then like /policies
+    /down      500 every time
+    """
+
+    pages = {}          # path -> (etag, {title: content})
+    hits = {}           # path -> requests received
+    conditional = {}    # path -> conditional requests received
+    flaky_failures = 2
+
+    def do_GET(self):
+        counts = FixtureHandler.hits
+        counts[self.path] = counts.get(self.path, 0) + 1
+        if self.path == "/down":
+            return self._send(500, b"down")
+        if self.path == "/flaky" and counts[self.path] <= self.flaky_failures:
+            return self._send(503, b"try again")
+        if self.path not in self.pages:
+            return self._send(404, b"not found")
+
+        etag, documents = self.pages[self.path]
+        if self.headers.get("If-None-Match") or self.headers.get("If-Modified-Since"):
+            FixtureHandler.conditional[self.path] = FixtureHandler.conditional.get(self.path, 0) + 1
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", {"ETag": etag})
+        body = json.dumps(documents).encode("utf-8")
+        return self._send(200, body, {"ETag": etag, "Last-Modified": LAST_MODIFIED,
+                                      "Content-Type": "application/json"})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_fixture(content, url):
+    """Parser in the shape of utils.parse_*: (content, url) -> {title: content}"""
+    return json.loads(content)
+
+
+def check(condition, message):
+    if not condition:
+        print(f"❌ {message}")
+        sys.exit(1)
+    print(f"✅ {message}")
+
+
+def main():
+    FixtureHandler.pages = {
+        "/policies": ('"v1"', {"Attendance": "Students attend every class."}),
+        "/flaky": ('"f1"', {"Grading": "Grades run from A to F."}),
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    sources = [(f"{base}/policies", parse_fixture), (f"{base}/flaky", parse_fixture), (f"{base}/down", parse_fixture)]
+
+    workdir = tempfile.mkdtemp(prefix="jericho_ingest_")
+    try:
+        store = DocumentStore(os.path.join(workdir, "documents.db"))
+        state_file = os.path.join(workdir, "ingest_state.json")
+
+        def run():
+            # No backoff so the retries do not slow the check down
+            session = ingest.create_session(pool_size=4, retries=3, backoff_factor=0)
+            return ingest.run_ingestion(sources, store=store, state_file=state_file, max_workers=4,
+                                        timeout=5, use_processes=False, session=session)
+
+        report = run()
+        check(report == {f"{base}/policies": "updated", f"{base}/flaky": "updated", f"{base}/down": "failed"},
+              f"first run: 200, 503-then-200 and 500 sources reported as {list(report.values())}")
+        check(FixtureHandler.hits["/flaky"] == FixtureHandler.flaky_failures + 1,
+              f"503s were retried ({FixtureHandler.hits['/flaky']} requests to /flaky)")
+        check(FixtureHandler.hits["/down"] == 4, f"500s gave up after 3 retries ({FixtureHandler.hits['/down']} requests)")
+        check(store["Attendance"] == "Students attend every class." and store["Grading"] == "Grades run from A to F.",
+              "documents written to the store")
+        check(store.get_document("Attendance")["source"] == f"{base}/policies", "documents keep their source URL")
+        state = ingest.load_state(state_file)
+        check(state.get(f"{base}/policies") == {"etag": '"v1"', "last_modified": LAST_MODIFIED}
+              and f"{base}/down" not in state, "ETag / Last-Modified saved for fetched sources only")
+
+        version = store.version()
+        report = run()
+        check(report[f"{base}/policies"] == "not_modified" and report[f"{base}/flaky"] == "not_modified",
+              "second run: conditional GETs answered with 304")
+        check(FixtureHandler.conditional.get("/policies") == 1, "saved validators were sent back to the server")
+        check(store.version() == version, "nothing written on a 304")
+
+        FixtureHandler.pages["/policies"] = ('"v2"', {"Attendance": "Attendance is taken at every class."})
+        report = run()
+        check(report[f"{base}/policies"] == "updated" and report[f"{base}/flaky"] == "not_modified",
+              "third run: only the changed page is fetched again")
+        check(store["Attendance"] == "Attendance is taken at every class.", "changed document replaced in the store")
+        check(ingest.load_state(state_file)[f"{base}/policies"]["etag"] == '"v2"', "new ETag saved")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("✅ Ingestion fixture checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Parity and throughput check for the int8 ONNX embedding backend.
+
+Encodes the stored chunks and a set of sample questions with both the
+PyTorch (sentence-transformers) model and the ONNX model, then reports:
+  - cosine agreement between the two embeddings of every chunk
+  - overlap of the top-k retrieved chunks for each question
+  - encode throughput (chunks/s) of each backend
+
+Exits non-zero when agreement falls below the thresholds, so it can gate a
+switch to EMBEDDING_BACKEND=onnx. Export the model first with
+`python embeddings.py --export-onnx`.
+
+Usage:
+    python benchmarks/onnx_parity.py [--limit 2000] [--top-k 5] [--output data/onnx_parity.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import embeddings
+from docstore import get_docstore
+
+SAMPLE_QUERIES = [
+    "What is the attendance policy?",
+    "How do I file a civil rights complaint?",
+    "Who can see my education records under FERPA?",
+    "When is the FAFSA deadline?",
+    "How many credits do I need to graduate?",
+    "What is the grade appeal process?",
+    "How do I request a leave of absence?",
+    "What happens if I am placed on academic probation?",
+    "How is sick leave accrued for employees?",
+    "Can I withdraw from a course after the deadline?",
+]
+
+MIN_MEAN_COSINE = 0.99
+MIN_TOPK_OVERLAP = 0.9
+
+
+def _normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def _timed_encode(model, texts, batch_size):
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+    return _normalize(np.asarray(vectors, dtype=np.float32)), len(texts) / elapsed
+
+
+def run(limit, top_k, batch_size):
+    store = get_docstore()
+    texts = [chunk["text"] for chunk in store.iter_chunks()][:limit]
+    if not texts:
+        raise SystemExit("No chunks in the document store, run the app or vectorstore indexing first")
+
+    torch_model = embeddings.get_embedding_model("torch")
+    onnx_model = embeddings.get_embedding_model("onnx")
+
+    torch_vectors, torch_rate = _timed_encode(torch_model, texts, batch_size)
+    onnx_vectors, onnx_rate = _timed_encode(onnx_model, texts, batch_size)
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=1)
+
+    torch_queries = _normalize(np.asarray(torch_model.encode(SAMPLE_QUERIES), dtype=np.float32))
+    onnx_queries = _normalize(np.asarray(onnx_model.encode(SAMPLE_QUERIES), dtype=np.float32))
+    overlaps = []
+    for torch_query, onnx_query in zip(torch_queries, onnx_queries):
+        torch_top = set(np.argsort(-(torch_vectors @ torch_query))[:top_k])
+        onnx_top = set(np.argsort(-(onnx_vectors @ onnx_query))[:top_k])
+        overlaps.append(len(torch_top & onnx_top) / top_k)
+
+    return {
+        "chunks": len(texts),
+        "top_k": top_k,
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "p01_cosine": float(np.percentile(cosines, 1)),
+        "mean_topk_overlap": float(np.mean(overlaps)),
+        "min_topk_overlap": float(np.min(overlaps)),
+        "torch_chunks_per_s": round(torch_rate, 1),
+        "onnx_chunks_per_s": round(onnx_rate, 1),
+        "speedup": round(onnx_rate / torch_rate, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=2000, help="Max chunks to encode")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=embeddings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--output", default="data/onnx_parity.json")
+    args = parser.parse_args()
+
+    report = run(args.limit, args.top_k, args.batch_size)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"⚡ ONNX int8: {report['onnx_chunks_per_s']} chunks/s vs PyTorch {report['torch_chunks_per_s']} "
+          f"chunks/s ({report['speedup']}x)")
+    if report["mean_cosine"] < MIN_MEAN_COSINE or report["mean_topk_overlap"] < MIN_TOPK_OVERLAP:
+        print("❌ ONNX embeddings diverge from PyTorch beyond the parity thresholds")
+        sys.exit(1)
+    print("✅ ONNX embeddings match PyTorch within the parity thresholds")
+
+
+if __name__ == "__main__":
+    main()
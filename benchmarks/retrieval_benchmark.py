@@ -0,0 +1,333 @@
+"""
+Offline retrieval quality and latency benchmark.
+
+Builds a throwaway index over data/tab_data.json (website pages and the
+extracted HR PDFs) with the chosen chunker, embedding backend and vector
+backend, then runs the labeled questions in benchmarks/questions.jsonl
+through logic.search_query and logic.generate_answer and reports:
+  - recall@k and MRR against the labels
+  - p50/p95/p99 latency of search_query (caches cleared per question) and of
+    generate_answer with a stub LLM (prompt building only)
+  - index build time, chunk count and memory
+
+With --shard the chroma backend stores each source in its own collection
+and questions are routed (routing.QueryRouter), to compare against one flat
+collection. benchmarks/questions_es.jsonl holds the same questions and labels
+in Spanish: with --multilingual, its recall should match the English run at
+the same top_k.
+
+Nothing leaves the machine: the LLM is replaced by a stub, Hugging Face is
+put in offline mode (models must already be in the local cache) and the
+app's own indexes and caches are not touched. The JSON report is meant to
+be committed or diffed between commits.
+
+A question counts a chunk as relevant when the chunk's title is one of
+relevant_titles and, if answer_contains is given, the chunk contains one of
+those phrases.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py --chunker structured --embedding torch \\
+        --backend faiss-hnsw [--no-hybrid] [--rerank] [--shard] [--multilingual] \\
+        [--questions benchmarks/questions_es.jsonl] [--output data/benchmarks/report.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS_FILE = os.path.join(ROOT, "benchmarks", "questions.jsonl")
+CORPUS_FILE = os.path.join(ROOT, "data", "tab_data.json")
+K_VALUES = (1, 3, 5, 10)
+
+
+# Chunkers: (title, content) -> [(chunk_id, text, metadata)]
+
+def _structured_chunker(title, content):
+    import chunking
+    import routing
+    return chunking.chunk_document(title, content, **routing.tag_document(title, content))
+
+
+def _chars500_chunker(title, content):
+    """The RecursiveCharacterTextSplitter setup the vectorstore used before chunking.py"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=500, chunk_overlap=50, length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    return _positional(title, content, splitter.split_text(f"{title}: {content}"))
+
+
+def _words200_chunker(title, content):
+    """The 200-word scheme utils.chunk_text used before chunking.py"""
+    words = content.split()
+    return _positional(title, content, [" ".join(words[i:i + 200]) for i in range(0, len(words), 200)])
+
+
+def _positional(title, content, texts):
+    import routing
+    tags = routing.tag_document(title, content)
+    return [(f"{title}_{i}", text, {"title": title, "chunk_index": i, **tags})
+            for i, text in enumerate(texts)]
+
+
+CHUNKERS = {
+    "structured": _structured_chunker,
+    "chars500": _chars500_chunker,
+    "words200": _words200_chunker,
+}
+BACKENDS = ("chroma", "faiss-flat", "faiss-hnsw", "faiss-ivf")
+
+
+class StubLLM:
+    """Stands in for ChatGroq: answers instantly without network access"""
+
+    def _message(self, prompt):
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=f"Stub answer for a {len(prompt)} character prompt.")
+
+    def invoke(self, prompt):
+        return self._message(prompt)
+
+    def stream(self, prompt):
+        from langchain_core.messages import AIMessageChunk
+        yield AIMessageChunk(content=self._message(prompt).content)
+
+    async def ainvoke(self, prompt):
+        return self._message(prompt)
+
+    async def astream(self, prompt):
+        from langchain_core.messages import AIMessageChunk
+        yield AIMessageChunk(content=self._message(prompt).content)
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentiles(samples_ms):
+    import numpy as np
+    if not samples_ms:
+        return {}
+    values = np.array(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def load_questions(path=QUESTIONS_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_relevant(question, title, text):
+    if title not in question["relevant_titles"]:
+        return False
+    phrases = question.get("answer_contains") or []
+    return not phrases or any(phrase.lower() in text.lower() for phrase in phrases)
+
+
+def build_index(args, corpus, workdir):
+    """
+    Chunks and indexes the corpus.
+
+    Returns:
+        tuple: (search_backend, chunks_by_id, build_stats)
+    """
+    import embeddings
+    import backends
+    from lexical import BM25Index
+
+    chunker = CHUNKERS[args.chunker]
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    chunks = [chunk for title, content in corpus.items() for chunk in chunker(title, content)]
+    chunk_seconds = time.perf_counter() - start
+
+    encode_start = time.perf_counter()
+    if args.backend == "chroma":
+        import chromadb
+        import routing
+        import vectorstore
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+        if args.shard:
+            collection = vectorstore.ShardedCollection("benchmark", client=client)
+            vectorstore.index_chunks(collection, iter(chunks))
+            dense = backends.ShardedBackend(collection, routing.QueryRouter(collection.shard_names(), collection.centroids()))
+        else:
+            collection = client.get_or_create_collection("benchmark")
+            vectorstore.index_chunks(collection, iter(chunks))
+            dense = backends.ChromaBackend(collection)
+    else:
+        dense = backends.FaissBackend.build(
+            iter(chunks),
+            lambda texts: embeddings.encode(texts, normalize=True, show_progress_bar=False),
+            index_type=args.backend.split("-", 1)[1],
+        )
+    index_seconds = time.perf_counter() - encode_start
+
+    search_backend = dense
+    if args.hybrid:
+        bm25 = BM25Index()
+        bm25.add([c[0] for c in chunks], [c[1] for c in chunks], [c[2] for c in chunks])
+        search_backend = backends.HybridBackend(dense, bm25)
+
+    chunks_by_id = {chunk_id: (metadata["title"], text) for chunk_id, text, metadata in chunks}
+    stats = {
+        "documents": len(corpus),
+        "chunks": len(chunks),
+        "avg_chunk_chars": round(sum(len(c[1]) for c in chunks) / max(len(chunks), 1), 1),
+        "chunk_seconds": round(chunk_seconds, 3),
+        "index_seconds": round(index_seconds, 3),
+        "build_seconds": round(chunk_seconds + index_seconds, 3),
+        "chunks_per_second": round(len(chunks) / max(index_seconds, 1e-9), 1),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_after_build_mb": round(_rss_mb(), 1),
+    }
+    return search_backend, chunks_by_id, stats
+
+
+def evaluate(args, search_backend, chunks_by_id, questions):
+    import logic
+
+    max_k = max(K_VALUES)
+    recall = {k: [] for k in K_VALUES}
+    reciprocal_ranks = []
+    search_ms = []
+    answer_ms = []
+    per_question = []
+
+    for question in questions:
+        for _ in range(args.repeats):
+            logic.query_embedding_cache.clear()
+            logic.retrieval_cache.clear()
+            start = time.perf_counter()
+            _, retrieved_chunks, _ = logic.search_query(question["question"], search_backend, top_k=max_k,
+                                                        use_rerank=args.rerank)
+            search_ms.append((time.perf_counter() - start) * 1000)
+
+        cache_key = logic._search_cache_key(question["question"], search_backend, max_k, args.rerank)
+        ranked_ids = logic.retrieval_cache.get(cache_key)["ids"]
+        ranked = [chunks_by_id[chunk_id] for chunk_id in ranked_ids]
+        hits = [is_relevant(question, title, text) for title, text in ranked]
+
+        first_hit = next((rank for rank, hit in enumerate(hits, start=1) if hit), None)
+        reciprocal_ranks.append(1.0 / first_hit if first_hit else 0.0)
+        for k in K_VALUES:
+            found = {title for (title, _), hit in zip(ranked[:k], hits[:k]) if hit}
+            recall[k].append(len(found) / len(question["relevant_titles"]))
+
+        # Prompt building and token budgeting with the stub LLM, on the top 3 chunks
+        logic.answer_cache.clear()
+        start = time.perf_counter()
+        logic.generate_answer(question["question"], retrieved_chunks[:3], None, question.get("language", "English"))
+        answer_ms.append((time.perf_counter() - start) * 1000)
+
+        per_question.append({
+            "id": question["id"],
+            "first_relevant_rank": first_hit,
+            "top_titles": [title for title, _ in ranked[:3]],
+        })
+
+    return {
+        "questions": len(questions),
+        "recall": {f"@{k}": round(sum(values) / len(values), 4) for k, values in recall.items()},
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+        "search_latency": _percentiles(search_ms),
+        "answer_latency_stub_llm": _percentiles(answer_ms),
+        "per_question": per_question,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunker", choices=sorted(CHUNKERS), default="structured")
+    parser.add_argument("--embedding", choices=("torch", "onnx"), default="torch")
+    parser.add_argument("--backend", choices=BACKENDS, default="chroma")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false", help="Dense retrieval only")
+    parser.add_argument("--rerank", action="store_true", help="Enable the cross-encoder stage")
+    parser.add_argument("--shard", action="store_true", help="Per-source chroma collections with query routing")
+    parser.add_argument("--multilingual", action="store_true",
+                        help="Embed with the multilingual model (MULTILINGUAL_RETRIEVAL) instead of the English one")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed search_query runs per question")
+    parser.add_argument("--questions", default=QUESTIONS_FILE)
+    parser.add_argument("--allow-download", action="store_true", help="Let Hugging Face fetch missing models")
+    parser.add_argument("--output", default=os.path.join("data", "benchmarks", "retrieval_report.json"))
+    args = parser.parse_args()
+    if args.shard and args.backend != "chroma":
+        parser.error("--shard needs --backend chroma")
+
+    workdir = tempfile.mkdtemp(prefix="jericho_bench_")
+    # Settings are read at import time, so they go into the environment first
+    os.environ["EMBEDDING_BACKEND"] = args.embedding
+    if args.multilingual:
+        os.environ["MULTILINGUAL_RETRIEVAL"] = "true"
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(workdir, "answer_cache.db")
+    if not args.allow_download:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+    import llm
+    import embeddings
+    llm._llm = StubLLM()
+    llm.rate_limiter = llm.RateLimiter(tokens_per_minute=10 ** 9, requests_per_minute=10 ** 9)
+    embeddings.warm_up()
+
+    with open(CORPUS_FILE, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    questions = load_questions(args.questions)
+
+    search_backend, chunks_by_id, build_stats = build_index(args, corpus, workdir)
+    results = evaluate(args, search_backend, chunks_by_id, questions)
+
+    report = {
+        "commit": _git_commit(),
+        "config": {
+            "chunker": args.chunker,
+            "embedding": args.embedding,
+            "embedding_model": embeddings.EMBEDDING_MODEL_NAME,
+            "questions": os.path.basename(args.questions),
+            "backend": args.backend,
+            "hybrid": args.hybrid,
+            "rerank": args.rerank,
+            "shard": args.shard,
+            "repeats": args.repeats,
+        },
+        "build": build_stats,
+        "peak_rss_mb": round(_rss_mb(), 1),
+        **results,
+    }
+    output = os.path.join(ROOT, args.output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    latency = report["search_latency"]
+    print(f"📊 {args.chunker} / {args.embedding} / {search_backend.name}: "
+          f"recall@3 {report['recall']['@3']:.3f}, recall@5 {report['recall']['@5']:.3f}, MRR {report['mrr']:.3f}")
+    print(f"⏱️ search_query p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms; "
+          f"build {build_stats['build_seconds']}s for {build_stats['chunks']} chunks")
+    print(f"✅ Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
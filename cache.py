@@ -0,0 +1,213 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Data version written by vectorstore.IndexManager on every index swap
+METADATA_FILE = "data/metadata.json"
+
+# metadata_file -> (mtime, tab_data_hash)
+_version_cache = {}
+
+
+def normalize_query(text):
+    """Lower-case and collapse whitespace so trivially different questions share a key"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def get_data_version(metadata_file=METADATA_FILE):
+    """
+    Returns the tab_data hash recorded in metadata.json. The file is only
+    re-read when its mtime changes, so calling this per query is cheap.
+    """
+    try:
+        mtime = os.path.getmtime(metadata_file)
+    except OSError:
+        return ""
+    cached = _version_cache.get(metadata_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(metadata_file, 'r') as f:
+            version = json.load(f).get("tab_data_hash", "")
+    except (OSError, json.JSONDecodeError):
+        version = ""
+    _version_cache[metadata_file] = (mtime, version)
+    return version
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+
+    All entries are dropped when version_fn() returns a different value than the
+    one seen on the previous access, which ties the cache to the indexed data.
+    """
+
+    def __init__(self, max_size=512, ttl=3600, version_fn=get_data_version):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._data.clear()
+            self._version = version
+
+    def get(self, key):
+        """Returns the cached value or None on a miss or an expired entry"""
+        with self._lock:
+            self._check_version()
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._check_version()
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+_ANSWER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace   TEXT NOT NULL,
+    language    TEXT NOT NULL,
+    context_key TEXT NOT NULL,
+    embedding   BLOB NOT NULL,
+    answer      TEXT NOT NULL,
+    created     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_context ON answers (namespace, language, context_key);
+CREATE INDEX IF NOT EXISTS answers_by_created ON answers (created);
+"""
+
+
+class SemanticAnswerCache:
+    """
+    SQLite-backed cache of LLM answers looked up by query-embedding similarity.
+
+    An entry only matches when the namespace (the embedding model), the
+    language and the retrieved context are the same and the cosine similarity
+    of the query embeddings reaches the threshold.
+    Entries older than max_age are dropped and the oldest go first once
+    max_entries is reached.
+
+    A put is a single-row insert, and every process that opens the same file
+    sees the others' answers, so a batch run can pre-warm the app's cache.
+    """
+
+    def __init__(self, path, threshold=0.95, max_entries=1000, max_age=7 * 24 * 3600, namespace=""):
+        self.path = path
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_ANSWER_SCHEMA)
+        return self._conn
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.max_age,))
+        conn.execute(
+            "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY created DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def get(self, query_embedding, language, context_key):
+        """Returns the best cached answer above the threshold, or None"""
+        import numpy as np
+
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT embedding, answer FROM answers"
+                " WHERE namespace = ? AND language = ? AND context_key = ? AND created >= ?",
+                (self.namespace, language, context_key, time.time() - self.max_age),
+            ).fetchall()
+            if rows:
+                query = np.asarray(query_embedding, dtype=np.float32)
+                matrix = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+                norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+                similarities = matrix @ query / np.maximum(norms, 1e-12)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return rows[best][1]
+            self.misses += 1
+            return None
+
+    def put(self, query_embedding, language, context_key, answer):
+        import numpy as np
+
+        embedding = np.asarray(query_embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO answers (namespace, language, context_key, embedding, answer, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, language, context_key, embedding, answer, time.time()),
+                )
+                self._evict(conn)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM answers")
+
+    def stats(self):
+        with self._lock:
+            size = self._connect().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": size,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,263 @@
+import os
+import re
+import hashlib
+from functools import lru_cache
+from dotenv import load_dotenv
+import embeddings
+
+load_dotenv()
+
+# Chunks are sized in embedding-model tokens so none are cut off by the
+# model's 256-token window (the two special tokens take two of them)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", str(embeddings.EMBEDDING_MAX_SEQ_LENGTH - 2)))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+TOKENIZER_NAME = os.getenv("CHUNK_TOKENIZER", embeddings.EMBEDDING_MODEL_NAME if "/" in embeddings.EMBEDDING_MODEL_NAME
+                           else f"sentence-transformers/{embeddings.EMBEDDING_MODEL_NAME}")
+# Bump when the chunking rules change so existing indexes are re-chunked
+CHUNKER_VERSION = f"structured-v1-{CHUNK_MAX_TOKENS}-{CHUNK_OVERLAP_TOKENS}-{TOKENIZER_NAME.rsplit('/', 1)[-1]}"
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+_SPACES_RE = re.compile(r"[ \u00a0]+")
+_PAGE_MARKER_RE = re.compile(r"^page\s*\|?\s*\d+$", re.IGNORECASE)
+# Page break written into extracted PDF text by ingest.ingest_pdfs
+_PAGE_BREAK_RE = re.compile(r"^\f(\d+)$")
+
+
+def page_marker(page_number):
+    """Line that marks the start of a PDF page in a document's text; see split_blocks"""
+    return f"\f{page_number}"
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name=TOKENIZER_NAME):
+    """
+    Returns the embedding model's fast tokenizer, loaded once per process.
+    Uses the tokenizer.json exported next to the ONNX model when there is one.
+    """
+    from tokenizers import Tokenizer
+
+    local_path = os.path.join(embeddings.EMBEDDING_ONNX_DIR, "tokenizer.json")
+    tokenizer = Tokenizer.from_file(local_path) if os.path.exists(local_path) else Tokenizer.from_pretrained(name)
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def count_tokens(texts):
+    """Model token counts (without special tokens) for a list of texts"""
+    if not texts:
+        return []
+    return [len(encoding.ids) for encoding in get_tokenizer().encode_batch(list(texts), add_special_tokens=False)]
+
+
+def chunk_id(title, text, occurrence=0):
+    """
+    Stable chunk ID from the chunk's own content, so an unchanged chunk keeps
+    its ID (and its embedding) when other parts of the document change.
+    """
+    key = f"{title}\x00{text}" if occurrence == 0 else f"{title}\x00{text}\x00{occurrence}"
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def _is_heading(line, next_line):
+    """Short line without closing punctuation, followed by body text"""
+    if next_line is None or len(line) > 80 or len(line.split()) > 10:
+        return False
+    if line.endswith((".", ",", ";")) or "\t" in line:
+        return False
+    return len(next_line) > len(line) or line.isupper() or line.endswith(":")
+
+
+def split_blocks(text):
+    """
+    Splits a document into structural blocks.
+
+    Returns:
+        list: (kind, text, first_page, last_page) tuples where kind is
+            "heading", "table" or "text". Consecutive tab-separated lines (see
+            utils.extract_table_as_text) form one table block. Pages come from
+            page_marker lines and are None for documents without them.
+    """
+    lines = []
+    page = None
+    for raw_line in text.replace("\r\n", "\n").split("\n"):
+        page_break = _PAGE_BREAK_RE.match(raw_line)
+        if page_break:
+            page = int(page_break.group(1))
+            continue
+        line = _SPACES_RE.sub(" ", raw_line).strip()
+        if line and not _PAGE_MARKER_RE.match(line):
+            lines.append((line, page))
+
+    blocks = []
+    for i, (line, page) in enumerate(lines):
+        next_line = lines[i + 1][0] if i + 1 < len(lines) else None
+        if "\t" in line:
+            kind = "table"
+        elif _is_heading(line, next_line):
+            kind = "heading"
+        else:
+            kind = "text"
+        # Prose is cut at page breaks so its chunks keep exact pages; tables are not
+        if blocks and kind == blocks[-1][0] and kind != "heading" and (kind == "table" or page == blocks[-1][3]):
+            blocks[-1] = (kind, blocks[-1][1] + "\n" + line, blocks[-1][2], page)
+        else:
+            blocks.append((kind, line, page, page))
+    return blocks
+
+
+def _token_windows(text, max_tokens, overlap):
+    """Cuts text into windows of max_tokens model tokens, overlapping by overlap"""
+    encoding = get_tokenizer().encode(text, add_special_tokens=False)
+    offsets = encoding.offsets
+    if len(offsets) <= max_tokens:
+        return [text]
+    step = max(1, max_tokens - overlap)
+    windows = []
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        windows.append(text[offsets[start][0]:offsets[end - 1][1]])
+        if end == len(offsets):
+            break
+    return windows
+
+
+def _split_oversized(kind, text, max_tokens, overlap):
+    """Breaks one block that does not fit into pieces that do"""
+    if kind == "table":
+        # Split on rows and repeat the header row in every piece
+        rows = text.split("\n")
+        header, body = rows[0], rows[1:]
+        units = [header + "\n" + row for row in body] if body else [header]
+        joiner = "\n"
+    else:
+        units = [sentence for sentence in _SENTENCE_END_RE.split(text) if sentence]
+        joiner = " "
+
+    pieces = []
+    current = []
+    current_tokens = 0
+    for unit, n_tokens in zip(units, count_tokens(units)):
+        if n_tokens > max_tokens:
+            if current:
+                pieces.append(joiner.join(current))
+                current, current_tokens = [], 0
+            pieces.extend(_token_windows(unit, max_tokens, overlap))
+            continue
+        if current and current_tokens + n_tokens + 1 > max_tokens:
+            pieces.append(joiner.join(current))
+            current, current_tokens = [], 0
+        if kind == "table" and current:
+            unit = unit.split("\n", 1)[1]  # header already leads this piece
+        current.append(unit)
+        current_tokens += n_tokens + 1
+    if current:
+        pieces.append(joiner.join(current))
+    return pieces
+
+
+def split_text(text, title="", max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a document into chunks of at most max_tokens model tokens.
+
+    Blocks are packed greedily. A heading always starts a new chunk and is
+    repeated at the top of every chunk of its section, and a table is never
+    merged with surrounding prose. Every chunk is prefixed with the document
+    title so it can be understood on its own.
+
+    Args:
+        text (str): Document content.
+        title (str): Document title, prepended to each chunk.
+        max_tokens (int): Token budget per chunk, title and heading included.
+        overlap (int): Tokens shared by consecutive windows of an over-long sentence.
+
+    Returns:
+        list[str]: The chunks in document order.
+    """
+    return [chunk for chunk, _, _ in split_text_with_pages(text, title, max_tokens, overlap)]
+
+
+def split_text_with_pages(text, title="", max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    split_text, keeping the PDF pages each chunk was taken from.
+
+    Returns:
+        list: (chunk, first_page, last_page) tuples; the pages are None when
+            the text has no page markers.
+    """
+    prefix = f"{title}\n" if title else ""
+    blocks = split_blocks(text)
+    if not blocks:
+        return []
+
+    chunks = []
+    heading = ""
+    heading_page = None
+    current = []
+    current_pages = []
+    current_tokens = 0
+    prefix_tokens = count_tokens([prefix])[0] if prefix else 0
+
+    def flush():
+        nonlocal current, current_pages, current_tokens
+        if current:
+            header = prefix + (heading + "\n" if heading else "")
+            pages = [page for page in current_pages if page is not None]
+            chunks.append((header + "\n".join(current), min(pages, default=None), max(pages, default=None)))
+        current, current_pages, current_tokens = [], [], 0
+
+    block_tokens = count_tokens([block[1] for block in blocks])
+    for (kind, block_text, first_page, last_page), n_tokens in zip(blocks, block_tokens):
+        if kind == "heading":
+            flush()
+            heading, heading_page = block_text, first_page
+            continue
+
+        heading_tokens = count_tokens([heading])[0] + 1 if heading else 0
+        available = max(max_tokens - prefix_tokens - heading_tokens, 16)
+        if kind == "table" and current:
+            flush()
+        if n_tokens > available:
+            flush()
+            for piece in _split_oversized(kind, block_text, available, overlap):
+                current, current_pages = [piece], [first_page, last_page]
+                flush()
+            continue
+        if current and current_tokens + n_tokens + 1 > available:
+            flush()
+        current.append(block_text)
+        current_pages.extend((first_page, last_page))
+        current_tokens += n_tokens + 1
+        if kind == "table":
+            flush()
+    flush()
+
+    # A heading with no body still deserves a chunk
+    if not chunks and heading:
+        chunks.append((prefix + heading, heading_page, heading_page))
+    return chunks
+
+
+def chunk_document(title, text, source="tab_data", audience=None, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    Chunks one document for indexing. source and audience (see
+    routing.tag_document) are copied into every chunk's metadata, and chunks
+    of PDFs get the "page" and "page_end" they were taken from.
+
+    Returns:
+        list: (chunk_id, text, metadata) tuples in document order, with
+            content-hash IDs (see chunk_id).
+    """
+    seen = {}
+    results = []
+    for i, (text_chunk, first_page, last_page) in enumerate(split_text_with_pages(text, title, max_tokens, overlap)):
+        occurrence = seen.get(text_chunk, 0)
+        seen[text_chunk] = occurrence + 1
+        metadata = {"title": title, "chunk_index": i, "source": source}
+        if audience:
+            metadata["audience"] = audience
+        if first_page is not None:
+            metadata["page"] = first_page
+            metadata["page_end"] = last_page
+        results.append((chunk_id(title, text_chunk, occurrence), text_chunk, metadata))
+    return results
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections.abc import Mapping
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DOCSTORE_PATH = os.getenv("DOCSTORE_PATH", "data/documents.db")
+# Legacy monolithic file, imported once by migrate_from_json
+TAB_DATA_FILE = "data/tab_data.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    title   TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    hash    TEXT NOT NULL,
+    source  TEXT NOT NULL DEFAULT 'tab_data',
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id    TEXT PRIMARY KEY,
+    title       TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    text        TEXT NOT NULL,
+    metadata    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_by_title ON chunks (title, chunk_index);
+"""
+
+_docstore = None
+_docstore_lock = threading.Lock()
+
+
+def calculate_document_hash(title, content):
+    """Calculate MD5 hash of a single document"""
+    return hashlib.md5(f"{title}\x00{content}".encode("utf-8")).hexdigest()
+
+
+class DocumentStore(Mapping):
+    """
+    SQLite-backed store of documents and their chunks.
+
+    Behaves like the old tab_data dict (title -> content) so existing callers keep
+    working, while lookups by title or chunk ID are indexed and appends only
+    touch the affected rows.
+    """
+
+    def __init__(self, path=DOCSTORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # Mapping interface: title -> content
+
+    def __getitem__(self, title):
+        document = self.get_document(title)
+        if document is None:
+            raise KeyError(title)
+        return document["content"]
+
+    def __iter__(self):
+        for title, _ in self.items():
+            yield title
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def items(self, batch_size=256):
+        """Stream (title, content) pairs without loading the whole corpus"""
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute("SELECT title, content FROM documents ORDER BY rowid")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    # Documents
+
+    def get_document(self, title):
+        """Returns {"title", "content", "hash", "source"} or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, content, hash, source FROM documents WHERE title = ?", (title,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"title": row[0], "content": row[1], "hash": row[2], "source": row[3]}
+
+    def put_documents(self, documents, source="tab_data"):
+        """
+        Inserts or replaces documents from a {title: content} dict.
+
+        Returns:
+            list: Titles whose content actually changed.
+        """
+        now = time.time()
+        changed = []
+        with self._lock, self._conn:
+            for title, content in documents.items():
+                doc_hash = calculate_document_hash(title, content)
+                row = self._conn.execute("SELECT hash FROM documents WHERE title = ?", (title,)).fetchone()
+                if row and row[0] == doc_hash:
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (title, content, hash, source, updated) VALUES (?, ?, ?, ?, ?)",
+                    (title, content, doc_hash, source, now),
+                )
+                changed.append(title)
+        return changed
+
+    def delete_documents(self, titles):
+        """Removes documents and their chunks"""
+        with self._lock, self._conn:
+            for title in titles:
+                self._conn.execute("DELETE FROM documents WHERE title = ?", (title,))
+                self._conn.execute("DELETE FROM chunks WHERE title = ?", (title,))
+
+    def document_hashes(self):
+        """Returns {title: hash} for every document"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT title, hash FROM documents"))
+
+    def version(self):
+        """Content hash of the whole store, changes whenever any document changes"""
+        hash_md5 = hashlib.md5()
+        with self._lock:
+            for title, doc_hash in self._conn.execute("SELECT title, hash FROM documents ORDER BY title"):
+                hash_md5.update(f"{title}\x00{doc_hash}\n".encode("utf-8"))
+        return hash_md5.hexdigest()
+
+    # Chunks
+
+    def put_chunks(self, title, chunk_ids, texts, metadatas):
+        """Replaces the stored chunks of one document"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE title = ?", (title,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, title, chunk_index, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (chunk_id, title, metadata.get("chunk_index", i), text, json.dumps(metadata, ensure_ascii=False))
+                    for i, (chunk_id, text, metadata) in enumerate(zip(chunk_ids, texts, metadatas))
+                ],
+            )
+
+    def chunk_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def get_chunk(self, chunk_id):
+        """Returns {"id", "title", "text", "metadata"} or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_id, title, text, metadata FROM chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "title": row[1], "text": row[2], "metadata": json.loads(row[3])}
+
+    def get_chunks(self, chunk_ids):
+        """Bulk get_chunk, preserving the order of chunk_ids and skipping unknown IDs"""
+        chunks = (self.get_chunk(chunk_id) for chunk_id in chunk_ids)
+        return [chunk for chunk in chunks if chunk is not None]
+
+    def iter_chunks(self, batch_size=256):
+        """Stream every chunk as {"id", "title", "text", "metadata"}"""
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute("SELECT chunk_id, title, text, metadata FROM chunks ORDER BY title, chunk_index")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield {"id": row[0], "title": row[1], "text": row[2], "metadata": json.loads(row[3])}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_docstore(path=DOCSTORE_PATH):
+    """Returns the process-wide DocumentStore"""
+    global _docstore
+    if _docstore is None:
+        with _docstore_lock:
+            if _docstore is None:
+                _docstore = DocumentStore(path)
+    return _docstore
+
+
+def legacy_pdf_name(title):
+    """
+    File name of an HR PDF stored under its path by the old tab_data.json
+    pipeline (e.g. "data\\hr_policies\\Travel.pdf"), or None for any other title.
+    ingest.ingest_pdfs stores PDFs under the bare file name.
+    """
+    if not title.lower().endswith(".pdf"):
+        return None
+    parts = re.split(r"[\\/]", title)
+    if len(parts) < 2 or "hr_policies" not in parts[:-1]:
+        return None
+    return parts[-1]
+
+
+def migrate_from_json(store, json_path=TAB_DATA_FILE):
+    """
+    One-time import of the legacy tab_data.json into the document store.
+    Safe to re-run: unchanged documents are skipped. HR PDFs are stored under
+    their file name, as ingest.ingest_pdfs does, unless it already did.
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        tab_data = json.load(f)
+    documents = {}
+    pdfs = {}
+    for title, content in tab_data.items():
+        name = legacy_pdf_name(title)
+        if name is None:
+            documents[title] = content
+        elif store.get_document(name) is None:
+            pdfs[name] = content
+    changed = store.put_documents(documents, source="tab_data")
+    changed += store.put_documents(pdfs, source="hr_policies")
+    print(f"📦 Migrated {len(changed)} of {len(tab_data)} documents from {json_path} to {store.path}")
+    return changed
+
+
+if __name__ == "__main__":
+    migrate_from_json(get_docstore())
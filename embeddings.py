@@ -0,0 +1,207 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Embedding configuration (override through environment / .env)
+ENGLISH_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Maps questions in Spanish, French and the other UI languages close to the
+# English chunks they ask about, so no query translation is needed
+MULTILINGUAL_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+MULTILINGUAL_RETRIEVAL = os.getenv("MULTILINGUAL_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL", MULTILINGUAL_EMBEDDING_MODEL if MULTILINGUAL_RETRIEVAL else ENGLISH_EMBEDDING_MODEL)
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "")  # empty = auto-detect cuda/cpu
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Unit-length vectors make Chroma's default L2 distance rank like cosine. Not every
+# model ends in a Normalize layer (the multilingual one does not), so encode() does it
+EMBEDDING_NORMALIZE = os.getenv("EMBEDDING_NORMALIZE", "true").lower() in ("1", "true", "yes")
+# Worker processes for bulk (index build) encoding; 0 encodes in-process
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "0"))
+# "torch" (sentence-transformers) or "onnx" (ONNX Runtime, int8, no torch import)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", f"data/onnx/{EMBEDDING_MODEL_NAME}")
+# all-MiniLM-L6-v2's window; the multilingual model defaults to 128 and is raised
+# to match, so both modes index the same chunks and fill the same prompt size
+EMBEDDING_MAX_SEQ_LENGTH = 256
+
+# One model per process, shared by every Streamlit session
+_model = None
+_model_lock = threading.Lock()
+# The HF fast tokenizer is not safe to call from several threads at once
+_encode_lock = threading.Lock()
+
+
+def _resolve_device():
+    """Pick the configured device, falling back to cuda when available"""
+    if EMBEDDING_DEVICE:
+        return EMBEDDING_DEVICE
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+class OnnxEncoder:
+    """
+    The embedding model on ONNX Runtime: int8 dynamically quantized transformer,
+    mean pooling and optional L2 normalization, matching the
+    sentence-transformers pipeline. Exposes the subset of SentenceTransformer.encode the app uses.
+    """
+
+    def __init__(self, model_dir=EMBEDDING_ONNX_DIR):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, "model_int8.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found, run: python embeddings.py --export-onnx")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(EMBEDDING_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        import numpy as np
+
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize_embeddings:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            outputs.append(pooled.astype(np.float32))
+        embeddings = np.vstack(outputs) if outputs else np.zeros((0, 384), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def export_onnx_model(output_dir=EMBEDDING_ONNX_DIR, model_name=EMBEDDING_MODEL_NAME):
+    """
+    One-time export of the embedding model to ONNX with int8 dynamic
+    quantization. Needs torch and optimum[onnxruntime]; serving does not.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    fp32_dir = os.path.join(output_dir, "fp32")
+    ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True).save_pretrained(fp32_dir)
+    quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+    quantizer.quantize(
+        save_dir=output_dir,
+        quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+    )
+    os.replace(os.path.join(output_dir, "model_quantized.onnx"), os.path.join(output_dir, "model_int8.onnx"))
+    AutoTokenizer.from_pretrained(hub_name).backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+    print(f"✅ Exported int8 ONNX model to {output_dir}")
+
+
+def get_embedding_model(backend=None):
+    """
+    Returns the process-wide embedding model (SentenceTransformer or
+    OnnxEncoder, per EMBEDDING_BACKEND), loading it on first use.
+    """
+    global _model
+    if backend is not None and backend != EMBEDDING_BACKEND:
+        return _load_model(backend)
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _load_model(EMBEDDING_BACKEND)
+    return _model
+
+
+def _load_model(backend):
+    if backend == "onnx":
+        print(f"🧠 Loading int8 ONNX embedding model from {EMBEDDING_ONNX_DIR}")
+        return OnnxEncoder()
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    from sentence_transformers import SentenceTransformer
+    device = _resolve_device()
+    print(f"🧠 Loading embedding model {EMBEDDING_MODEL_NAME} on {device}")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=device)
+    model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+    return model
+
+
+def encode(texts, batch_size=None, normalize=None, show_progress_bar=None, pool=None):
+    """
+    Encodes a string or a list of strings with the shared embedding model.
+
+    Args:
+        texts (str | list[str]): A single text returns a 1-D array, a list returns a 2-D array.
+        batch_size (int, optional): Defaults to EMBEDDING_BATCH_SIZE.
+        normalize (bool, optional): L2-normalize the vectors. Defaults to EMBEDDING_NORMALIZE.
+        show_progress_bar (bool, optional): Defaults to True only for multi-batch inputs.
+        pool (dict, optional): Worker pool from start_encode_pool to spread a list across processes.
+    """
+    model = get_embedding_model()
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    normalize = EMBEDDING_NORMALIZE if normalize is None else normalize
+
+    if pool is not None and not isinstance(texts, str):
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        if normalize:
+            import numpy as np
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    if show_progress_bar is None:
+        show_progress_bar = not isinstance(texts, str) and len(texts) > batch_size
+
+    with _encode_lock:
+        return model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize,
+            show_progress_bar=show_progress_bar,
+        )
+
+
+def start_encode_pool(processes=None):
+    """
+    Starts worker processes for bulk encoding. Returns None when multi-process
+    encoding is disabled, which encode() treats as in-process.
+    """
+    processes = EMBEDDING_PROCESSES if processes is None else processes
+    # ONNX Runtime already spreads one batch across cores with its intra-op threads
+    if processes <= 1 or EMBEDDING_BACKEND == "onnx":
+        return None
+    model = get_embedding_model()
+    print(f"🧵 Starting {processes} embedding worker processes")
+    return model.start_multi_process_pool(target_devices=[_resolve_device()] * processes)
+
+
+def stop_encode_pool(pool):
+    if pool is not None:
+        from sentence_transformers import SentenceTransformer
+        SentenceTransformer.stop_multi_process_pool(pool)
+
+
+def warm_up():
+    """
+    Loads the model and runs one throwaway encode so the first real query is fast.
+    """
+    encode("warm up")
+    print("🔥 Embedding model warmed up")
+    return get_embedding_model()
+
+
+if __name__ == "__main__":
+    import sys
+    if "--export-onnx" in sys.argv:
+        export_onnx_model()
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils import (
+    parse_tab_data,
+    parse_ferpa_data,
+    parse_civil_rights_data,
+    parse_file_complaint_data,
+    parse_fafsa_data,
+    extract_pdf_pages,
+)
+import docstore
+import chunking
+
+# (URL, parser) pairs scraped into tab_data.json. Parsers take (content, url) and return a dict.
+DEFAULT_SOURCES = [
+    ("https://www.dinecollege.edu/academics/academic-policies/", parse_tab_data),
+    ("https://studentprivacy.ed.gov/ferpa", parse_ferpa_data),
+    ("https://www.ed.gov/laws-and-policy/civil-rights-laws", parse_civil_rights_data),
+    ("https://www.ed.gov/laws-and-policy/civil-rights-laws/file-complaint", parse_file_complaint_data),
+    ("https://www.ed.gov/higher-education/paying-college/better-fafsa", parse_fafsa_data),
+]
+
+# ETag / Last-Modified per URL, used for conditional GETs
+INGEST_STATE_FILE = "data/ingest_state.json"
+
+# File hash and page count per ingested PDF
+PDF_MANIFEST_FILE = "data/pdf_manifest.json"
+# Bump when the stored PDF text changes shape so every PDF is extracted again
+PDF_TEXT_FORMAT = "page-markers-v1"
+
+
+def create_session(pool_size=8, retries=3, backoff_factor=0.5):
+    """
+    Returns a requests.Session with a connection pool and retries on transient errors.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_state(state_file=INGEST_STATE_FILE):
+    """Load the per-URL conditional GET state"""
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _write_json(data, path, indent=None):
+    """Write JSON through a temp file so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def fetch_source(session, url, state, timeout=30):
+    """
+    Fetches one URL, sending If-None-Match / If-Modified-Since from a previous run.
+
+    Returns:
+        tuple: (url, status_code, content, headers). content is None on a 304 or an error.
+    """
+    headers = {}
+    previous = state.get(url, {})
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return url, 304, None, response.headers
+        response.raise_for_status()
+        return url, response.status_code, response.content, response.headers
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching URL {url}: {e}")
+        return url, None, None, {}
+
+
+def _parse(parser, content, url):
+    """Module-level so it can be shipped to a worker process"""
+    return parser(content, url) or {}
+
+
+def run_ingestion(sources=DEFAULT_SOURCES, store=None,
+                  state_file=INGEST_STATE_FILE, max_workers=8, timeout=30, retries=3,
+                  use_processes=True, session=None):
+    """
+    Fetches all sources concurrently, parses them in a worker pool and writes the
+    changed documents to the document store in one transaction per source.
+
+    Unchanged pages (HTTP 304) are skipped, and a source that fails to fetch
+    keeps whatever the store already holds for it.
+
+    Args:
+        sources (list): (url, parser) pairs.
+        store (DocumentStore, optional): Defaults to docstore.get_docstore().
+        state_file (str): Where ETag / Last-Modified headers are kept.
+        max_workers (int): Concurrent fetches and parser workers.
+        timeout (int): Per-request timeout in seconds.
+        retries (int): Retries for connection errors and 429/5xx responses.
+        use_processes (bool): Parse in a process pool instead of threads.
+        session (requests.Session, optional): Pre-configured session to fetch with.
+
+    Returns:
+        dict: Per-URL status ("updated", "not_modified" or "failed").
+    """
+    start = time.time()
+    state = load_state(state_file)
+    session = session or create_session(pool_size=max_workers, retries=retries)
+    parsers = dict(sources)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fetched = list(pool.map(lambda source: fetch_source(session, source[0], state, timeout), sources))
+
+    to_parse = [(url, content) for url, status, content, _ in fetched if content is not None]
+    executor_cls = ProcessPoolExecutor if use_processes and len(to_parse) > 1 else ThreadPoolExecutor
+    with executor_cls(max_workers=max_workers) as pool:
+        futures = {url: pool.submit(_parse, parsers[url], content, url) for url, content in to_parse}
+        parsed = {}
+        for url, future in futures.items():
+            try:
+                parsed[url] = future.result()
+            except Exception as e:
+                print(f"Error parsing {url}: {e}")
+
+    report = {}
+    for url, status, content, headers in fetched:
+        if url in parsed:
+            state[url] = {
+                "etag": headers.get("ETag", ""),
+                "last_modified": headers.get("Last-Modified", ""),
+            }
+            report[url] = "updated"
+        elif status == 304:
+            report[url] = "not_modified"
+        else:
+            report[url] = "failed"
+
+    # Write in source order so later sources win on duplicate titles, as before
+    store = docstore.get_docstore() if store is None else store
+    for url, _ in sources:
+        if report[url] == "updated":
+            store.put_documents(parsed[url], source=url)
+
+    _write_json(state, state_file)
+
+    elapsed = time.time() - start
+    print(f"✅ Ingested {len(sources)} sources in {elapsed:.2f}s: {report}")
+    return report
+
+
+def _file_hash(path):
+    """MD5 of a file, read in 1 MB blocks"""
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hash_md5.update(block)
+    return hash_md5.hexdigest()
+
+
+def _extract_pdf(pdf_path):
+    """
+    Worker: extract one PDF, starting every page with a chunking.page_marker
+    line so chunks carry the page numbers they come from.
+    """
+    pages = extract_pdf_pages(pdf_path)
+    text = "\n".join(f"{chunking.page_marker(page_number)}\n{page_text}" for page_number, page_text in pages)
+    return text, len(pages)
+
+
+def ingest_pdfs(pdf_directory, store=None,
+                manifest_file=PDF_MANIFEST_FILE, max_workers=None):
+    """
+    Extracts the PDFs in pdf_directory in a process pool and writes all of them
+    to the document store in one batch. PDFs whose file hash matches the
+    manifest are skipped.
+
+    Page numbers stay in the stored text as page markers, which
+    chunking.chunk_document turns into "page" / "page_end" chunk metadata.
+
+    Returns:
+        list: Filenames that were (re-)extracted.
+    """
+    start = time.time()
+    manifest = load_state(manifest_file)
+    pdf_paths = sorted(
+        os.path.join(pdf_directory, name)
+        for name in os.listdir(pdf_directory)
+        if name.lower().endswith(".pdf")
+    )
+
+    changed = {}
+    for pdf_path in pdf_paths:
+        filename = os.path.basename(pdf_path)
+        file_hash = _file_hash(pdf_path)
+        entry = manifest.get(filename, {})
+        if entry.get("hash") != file_hash or entry.get("format") != PDF_TEXT_FORMAT:
+            changed[pdf_path] = file_hash
+
+    # Copies migrated from tab_data.json under their old path would duplicate every PDF
+    store = docstore.get_docstore() if store is None else store
+    filenames = {os.path.basename(pdf_path) for pdf_path in pdf_paths}
+    legacy = [title for title in store if docstore.legacy_pdf_name(title) in filenames]
+    if legacy:
+        store.delete_documents(legacy)
+        print(f"🗑️ Removed {len(legacy)} HR PDFs stored under their old tab_data path")
+
+    if not changed:
+        print(f"📚 All {len(pdf_paths)} PDFs unchanged, nothing to extract")
+        return []
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pdf_path: pool.submit(_extract_pdf, pdf_path) for pdf_path in changed}
+        for pdf_path, future in futures.items():
+            filename = os.path.basename(pdf_path)
+            try:
+                text, page_count = future.result()
+            except Exception as e:
+                print(f"Error extracting {pdf_path}: {e}")
+                continue
+            results[filename] = text
+            manifest[filename] = {"hash": changed[pdf_path], "format": PDF_TEXT_FORMAT, "pages": page_count}
+            print(f"📄 {filename}: {page_count} pages")
+
+    store.put_documents(results, source="hr_policies")
+    _write_json(manifest, manifest_file)
+
+    print(f"✅ Extracted {len(results)} of {len(pdf_paths)} PDFs in {time.time() - start:.2f}s")
+    return list(results)
+
+
+if __name__ == "__main__":
+    run_ingestion()
+    ingest_pdfs("data/hr_policies")
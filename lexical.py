@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter, defaultdict
+
+BM25_INDEX_FILE = "data/bm25_index.json"
+
+# Keeps policy numbers ("5.2.1"), amounts ("1,500") and form names ("i-9") as single terms
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,/-][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or "
+    "the this that to was what when where which who will with you your".split()
+)
+# Bump when tokenize changes so saved postings are rebuilt instead of reused
+TOKENIZER_VERSION = "bm25-tokens-v1"
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over chunks. Query cost only depends on the
+    postings of the query terms, which keeps lookups well under a millisecond
+    for this corpus. Chunks can be added and removed incrementally.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self.doc_len = {}                  # chunk_id -> number of terms
+        self.chunks = {}                   # chunk_id -> (text, metadata)
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, chunk_ids, texts, metadatas):
+        for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+            if chunk_id in self.doc_len:
+                self.remove([chunk_id])
+            terms = tokenize(text)
+            for term, tf in Counter(terms).items():
+                self.postings[term][chunk_id] = tf
+            self.doc_len[chunk_id] = len(terms)
+            self.total_len += len(terms)
+            self.chunks[chunk_id] = (text, metadata)
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            if chunk_id not in self.doc_len:
+                continue
+            text, _ = self.chunks.pop(chunk_id)
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_len -= self.doc_len.pop(chunk_id)
+
+    def search(self, query, top_k=10):
+        """Returns [(chunk_id, score)] best first"""
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+        avg_len = self.total_len / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[chunk_id] / avg_len)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path=BM25_INDEX_FILE):
+        """Writes the chunks together with their postings, so load needs no tokenizing"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "tokenizer": TOKENIZER_VERSION,
+                "chunks": self.chunks,
+                "postings": self.postings,
+                "doc_len": self.doc_len,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=BM25_INDEX_FILE):
+        """
+        Loads a saved index, or returns an empty one if there is none. Files
+        without postings or from another tokenizer version are re-tokenized.
+        """
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        chunks = saved["chunks"]
+        if saved.get("tokenizer") == TOKENIZER_VERSION and "postings" in saved:
+            index.postings = defaultdict(dict, saved["postings"])
+            index.doc_len = saved["doc_len"]
+            index.chunks = {chunk_id: tuple(chunk) for chunk_id, chunk in chunks.items()}
+            index.total_len = sum(index.doc_len.values())
+        else:
+            ids = list(chunks)
+            index.add(ids, [chunks[i][0] for i in ids], [chunks[i][1] for i in ids])
+        return index
+
+    @classmethod
+    def from_store(cls, store):
+        """Builds an index from every chunk in a DocumentStore"""
+        index = cls()
+        for chunk in store.iter_chunks():
+            index.add([chunk["id"]], [chunk["text"]], [chunk["metadata"]])
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several best-first lists of IDs. Returns [(id, score)] best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,252 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "Llama3-8b-8192")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "4192"))
+LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "60"))
+
+# Groq account quota and client-side limits
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+# Completion tokens reserved per request on top of the prompt, since Groq counts both
+LLM_RESERVED_OUTPUT_TOKENS = int(os.getenv("LLM_RESERVED_OUTPUT_TOKENS", "512"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Requests allowed to wait for capacity before new ones are turned away
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when the request queue is full or capacity does not free up in time"""
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for tokens and requests per minute plus a cap on
+    concurrent calls. Callers block in acquire() until there is room, so bursts
+    queue up client-side instead of turning into 429s.
+    """
+
+    def __init__(self, tokens_per_minute=GROQ_TPM_LIMIT, requests_per_minute=GROQ_RPM_LIMIT,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    def _seconds_until_ready(self, tokens):
+        """None when only a concurrency slot is missing (woken by release)"""
+        token_wait = max(0.0, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        request_wait = max(0.0, (1 - self._requests) * 60 / self.requests_per_minute)
+        wait = max(token_wait, request_wait)
+        return wait if wait > 0 else None
+
+    def _try_take(self, tokens):
+        self._refill()
+        if self._in_flight < self.max_concurrency and self._tokens >= tokens and self._requests >= 1:
+            self._tokens -= tokens
+            self._requests -= 1
+            self._in_flight += 1
+            return True
+        return False
+
+    @contextmanager
+    def acquire(self, tokens, timeout=LLM_QUEUE_TIMEOUT):
+        """
+        Waits for a concurrency slot and enough token/request budget, then holds
+        the slot for the duration of the with-block.
+
+        Raises:
+            LLMOverloadedError: The queue is full or the wait exceeded timeout.
+        """
+        # A single request larger than the bucket could otherwise never run
+        tokens = min(tokens, self.tokens_per_minute)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._try_take(tokens):
+                if self._waiting >= self.max_queue:
+                    metrics.inc("llm_rejected_total", reason="queue_full")
+                    raise LLMOverloadedError("Too many questions are waiting for the LLM")
+                self._waiting += 1
+                try:
+                    while not self._try_take(tokens):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            metrics.inc("llm_rejected_total", reason="timeout")
+                            raise LLMOverloadedError("Timed out waiting for LLM capacity")
+                        wait = self._seconds_until_ready(tokens)
+                        self._cond.wait(remaining if wait is None else min(wait, remaining))
+                finally:
+                    self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aacquire(self, tokens, timeout=LLM_QUEUE_TIMEOUT):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the loop"""
+        tokens = min(tokens, self.tokens_per_minute)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            taken = self._try_take(tokens)
+            if not taken:
+                if self._waiting >= self.max_queue:
+                    metrics.inc("llm_rejected_total", reason="queue_full")
+                    raise LLMOverloadedError("Too many questions are waiting for the LLM")
+                self._waiting += 1
+        if not taken:
+            try:
+                while not taken:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.inc("llm_rejected_total", reason="timeout")
+                        raise LLMOverloadedError("Timed out waiting for LLM capacity")
+                    with self._cond:
+                        wait = self._seconds_until_ready(tokens)
+                    # No timed refill to wait for means a slot is busy: poll briefly
+                    await asyncio.sleep(min(wait or 0.05, remaining))
+                    with self._cond:
+                        taken = self._try_take(tokens)
+            finally:
+                with self._cond:
+                    self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record_usage(self, extra_tokens):
+        """Charge (or refund) the difference between reserved and actual tokens"""
+        with self._cond:
+            self._tokens = min(self.tokens_per_minute, self._tokens - extra_tokens)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._refill()
+            return {
+                "tokens_available": int(self._tokens),
+                "requests_available": int(self._requests),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+            }
+
+
+rate_limiter = RateLimiter()
+
+
+def _limiter_metrics():
+    return [(f"llm_limiter_{key}", {}, value) for key, value in rate_limiter.stats().items()]
+
+
+metrics.register_collector(_limiter_metrics)
+
+
+def get_llm():
+    """
+    Returns the process-wide ChatGroq client. Its HTTP client keeps connections
+    alive across questions and sessions.
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                import httpx
+                from langchain_groq import ChatGroq
+                limits = httpx.Limits(
+                    max_connections=LLM_MAX_CONCURRENCY * 2,
+                    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                    keepalive_expiry=60,
+                )
+                _llm = ChatGroq(
+                    model=LLM_MODEL,
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    temperature=0,
+                    max_tokens=LLM_MAX_TOKENS,
+                    timeout=LLM_TIMEOUT,
+                    max_retries=2,
+                    http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+                )
+    return _llm
+
+
+def _actual_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+def _record_usage(prompt_tokens, reserved, actual):
+    """Settle the reservation with the limiter and count the tokens used"""
+    metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+    if actual is not None:
+        rate_limiter.record_usage(actual - reserved)
+        metrics.inc("llm_tokens_total", max(actual - prompt_tokens, 0), kind="completion")
+
+
+def invoke(prompt, prompt_tokens):
+    """Rate-limited llm.invoke on the shared client"""
+    reserved = prompt_tokens + LLM_RESERVED_OUTPUT_TOKENS
+    with rate_limiter.acquire(reserved):
+        response = get_llm().invoke(prompt)
+    _record_usage(prompt_tokens, reserved, _actual_tokens(response))
+    return response
+
+
+def stream(prompt, prompt_tokens):
+    """Rate-limited llm.stream on the shared client; the slot is held until the stream ends"""
+    reserved = prompt_tokens + LLM_RESERVED_OUTPUT_TOKENS
+    actual = None
+    with rate_limiter.acquire(reserved):
+        for chunk in get_llm().stream(prompt):
+            actual = _actual_tokens(chunk) or actual
+            yield chunk
+    _record_usage(prompt_tokens, reserved, actual)
+
+
+async def ainvoke(prompt, prompt_tokens):
+    """Rate-limited llm.ainvoke on the shared client"""
+    reserved = prompt_tokens + LLM_RESERVED_OUTPUT_TOKENS
+    async with rate_limiter.aacquire(reserved):
+        response = await get_llm().ainvoke(prompt)
+    _record_usage(prompt_tokens, reserved, _actual_tokens(response))
+    return response
+
+
+async def astream(prompt, prompt_tokens):
+    """Rate-limited llm.astream on the shared client"""
+    reserved = prompt_tokens + LLM_RESERVED_OUTPUT_TOKENS
+    actual = None
+    async with rate_limiter.aacquire(reserved):
+        async for chunk in get_llm().astream(prompt):
+            actual = _actual_tokens(chunk) or actual
+            yield chunk
+    _record_usage(prompt_tokens, reserved, actual)
@@ -1,50 +1,223 @@
-from langchain.chains.question_answering import load_qa_chain
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
 import os
-import tiktoken
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
-from utils import generate_embeddings
+import embeddings
+from cache import LRUCache, SemanticAnswerCache, normalize_query
+from tokens import count_tokens, count_tokens_batch, fit_chunks_to_budget
+import llm
+from backends import VectorBackend
+import rerank
+import metrics
+import hashlib
 
 load_dotenv()
 
 # Remove the circular import from app.py
 # Instead, we'll pass the collection as a parameter to the functions
 
-def search_query(user_query, collection, top_k=3):
-    """Search ChromaDB for relevant documents based on user query"""
-    # Generate embedding for the query
-    query_embedding = generate_embeddings(user_query)
-    
-    # Query the collection
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
-    )
-    
+# Query embeddings keyed on normalized text, retrieval results keyed on
+# (collection, normalized text, top_k). Both are flushed when tab_data changes.
+CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+query_embedding_cache = LRUCache(max_size=CACHE_SIZE, ttl=CACHE_TTL)
+retrieval_cache = LRUCache(max_size=CACHE_SIZE, ttl=CACHE_TTL)
+
+def embed_query(user_query):
+    """Return the (cached) embedding for a user query"""
+    key = normalize_query(user_query)
+    query_embedding = query_embedding_cache.get(key)
+    if query_embedding is None:
+        with metrics.span("embed"):
+            query_embedding = embeddings.encode(user_query)
+        query_embedding_cache.put(key, query_embedding)
+    return query_embedding
+
+def embed_queries(user_queries):
+    """Embeddings for several queries; cache misses are encoded in one batch"""
+    keys = [normalize_query(user_query) for user_query in user_queries]
+    query_embeddings = [query_embedding_cache.get(key) for key in keys]
+    missing = [i for i, query_embedding in enumerate(query_embeddings) if query_embedding is None]
+    if missing:
+        with metrics.span("embed"):
+            encoded = embeddings.encode([user_queries[i] for i in missing], show_progress_bar=False)
+        for i, query_embedding in zip(missing, encoded):
+            query_embedding_cache.put(keys[i], query_embedding)
+            query_embeddings[i] = query_embedding
+    return query_embeddings
+
+def _search_cache_key(user_query, collection, top_k, use_rerank):
+    return (collection.name, normalize_query(user_query), top_k, use_rerank)
+
+def _cached_search(cached):
+    return list(cached["titles"]), list(cached["chunks"]), list(cached["distances"])
+
+def _unpack_results(results, cache_key):
+    """Turn a Chroma-shaped result for one query into (titles, chunks, distances) and cache it"""
     retrieved_chunks = results['documents'][0]  # Top k chunks
     chunk_metadata = results['metadatas'][0]    # Metadata for each chunk
     distances = results['distances'][0]         # Distance scores
     
     # Get the unique titles from the retrieved chunks
     retrieved_titles = list(set([metadata['title'] for metadata in chunk_metadata]))
+
+    retrieval_cache.put(cache_key, {
+        "ids": results['ids'][0],
+        "titles": retrieved_titles,
+        "chunks": retrieved_chunks,
+        "distances": distances,
+    })
     
     return retrieved_titles, retrieved_chunks, distances
 
-def generate_answer(user_query, retrieved_chunks, tab_data, communication_language):
+# Event loop the sync API runs the async path on, started on first use
+_loop = None
+_loop_lock = threading.Lock()
+
+def _event_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="logic-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def _run_sync(coro):
+    """Run a coroutine of the async API on the shared loop and wait for its result"""
+    loop = _event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("The sync logic API cannot be called from its own event loop; await the async one")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+async def _asearch(user_queries, collection, top_k, use_rerank):
     """
-    Generates an answer to the user's query using the LLaMA model (via ChatGroq).
+    The one retrieval path behind search_query, search_queries and their
+    async versions. Questions in the retrieval cache are answered from it; the
+    rest are embedded in one encode call and searched with one multi-query
+    collection.query. Encoding, the query and reranking run off the event loop.
     """
-    chunk_context = "\n\n".join(retrieved_chunks)
+    start = time.perf_counter()
+    use_rerank = rerank.RERANK_ENABLED if use_rerank is None else use_rerank
+    searched = [None] * len(user_queries)
+    pending = []
+    for i, user_query in enumerate(user_queries):
+        cached = retrieval_cache.get(_search_cache_key(user_query, collection, top_k, use_rerank))
+        if cached is not None:
+            searched[i] = _cached_search(cached)
+        else:
+            pending.append(i)
+    if not pending:
+        return searched
+
+    pending_queries = [user_queries[i] for i in pending]
+    query_embeddings = await asyncio.to_thread(embed_queries, pending_queries)
+    n_results = max(top_k, rerank.RERANK_CANDIDATES) if use_rerank else top_k
+
+    with metrics.span("vector_query"):
+        if isinstance(collection, VectorBackend):
+            results = await collection.aquery(query_embeddings=query_embeddings, n_results=n_results,
+                                              query_texts=pending_queries)
+        else:
+            results = await asyncio.to_thread(collection.query, query_embeddings=query_embeddings,
+                                              n_results=n_results)
+
+    # Each question is charged its share of the batched embed and query against the rerank budget
+    shared_ms = (time.perf_counter() - start) * 1000 / len(pending)
+    for row, i in enumerate(pending):
+        row_results = {key: [results[key][row]] for key in ("ids", "documents", "metadatas", "distances")}
+        if use_rerank:
+            with metrics.span("rerank"):
+                row_results = await asyncio.to_thread(rerank.rerank_results, user_queries[i], row_results,
+                                                      top_k, shared_ms)
+        searched[i] = _unpack_results(row_results, _search_cache_key(user_queries[i], collection, top_k, use_rerank))
+    metrics.observe("search" if len(user_queries) == 1 else "search_batch", time.perf_counter() - start)
+    return searched
+
+async def asearch_query(user_query, collection, top_k=3, use_rerank=None):
+    """
+    Search the vector store for relevant documents based on user query.
+    collection can be a ChromaDB collection or any backends.VectorBackend.
+
+    With reranking (use_rerank, default RERANK_ENABLED) a wider candidate set is
+    retrieved and a cross-encoder picks the best top_k within the latency budget.
+
+    Returns:
+        tuple: (titles, chunks, distances).
+    """
+    return (await _asearch([user_query], collection, top_k, use_rerank))[0]
+
+async def asearch_queries(user_queries, collection, top_k=3, use_rerank=None):
+    """
+    Batched asearch_query.
+
+    Returns:
+        list: (titles, chunks, distances) per question, in input order.
+    """
+    return await _asearch(list(user_queries), collection, top_k, use_rerank)
+
+def search_query(user_query, collection, top_k=3, use_rerank=None):
+    """Blocking asearch_query"""
+    return _run_sync(asearch_query(user_query, collection, top_k, use_rerank))
+
+def search_queries(user_queries, collection, top_k=3, use_rerank=None):
+    """Blocking asearch_queries"""
+    return _run_sync(asearch_queries(user_queries, collection, top_k, use_rerank))
+
+# Answers reused for near-identical questions over the same retrieved chunks
+answer_cache = SemanticAnswerCache(
+    os.getenv("ANSWER_CACHE_PATH", "data/answer_cache.db"),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    max_age=int(os.getenv("ANSWER_CACHE_MAX_AGE", str(7 * 24 * 3600))),
+    # Query embeddings of different models are not comparable
+    namespace=embeddings.EMBEDDING_MODEL_NAME,
+)
+
+def context_key(retrieved_chunks):
+    """Order-independent key for a set of retrieved chunks (content-addressed chunk IDs)"""
+    chunk_ids = sorted(hashlib.md5(chunk.encode("utf-8")).hexdigest() for chunk in retrieved_chunks)
+    return hashlib.md5("|".join(chunk_ids).encode("utf-8")).hexdigest()
+
+def cache_stats():
+    """Hit/miss counters for the query embedding, retrieval and answer caches"""
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
+
+def _cache_metrics():
+    samples = []
+    for cache, stats in cache_stats().items():
+        samples.append(("cache_hit_ratio", {"cache": cache}, stats["hit_ratio"]))
+        samples.append(("cache_entries", {"cache": cache}, stats["size"]))
+    return samples
+
+metrics.register_collector(_cache_metrics, {
+    "cache_hit_ratio": "Hit ratio of the query embedding, retrieval and answer caches",
+    "cache_entries": "Entries held by each cache",
+})
 
-    fallback_messages = {
+# Fixed reply for questions the documents and the model cannot answer, per UI language.
+# Navajo uses the English sentence unchanged until a fluent speaker provides a translation.
+FALLBACK_MESSAGES = {
     "English": "I'm sorry, but that question is outside the scope of the provided information.",
     "Spanish": "Lo siento, pero esa pregunta está fuera del alcance de la información proporcionada.",
-    "French": "Je suis désolé, mais cette question dépasse le cadre des informations fournies."
-    }
-    fallback_response = fallback_messages.get(communication_language, fallback_messages["English"])
+    "Navajo": "I'm sorry, but that question is outside the scope of the provided information.",
+    "French": "Je suis désolé, mais cette question dépasse le cadre des informations fournies.",
+}
 
-    prompt = f"""
+def build_prompt(user_query, chunk_context, communication_language, fallback_response):
+    """Fill the answer prompt template"""
+    return f"""
                 You are an expert assistant helping users. 
                 Answer the user's question primarily using the information provided below.
                 
@@ -76,33 +249,148 @@ def generate_answer(user_query, retrieved_chunks, tab_data, communication_langua
                 ### Answer:
                 """
 
-    llm = ChatGroq(
-        model="Llama3-8b-8192",
-        api_key=os.getenv("GROQ_API_KEY"),
-        temperature=0,
-        max_tokens=4192,
-        timeout=60,
-        max_retries=2,
-    )
-
-    # Count tokens in the prompt
-    token_count = count_tokens(prompt)
-    print(f"📊 Sending {token_count} tokens to the LLM")
-
-    # Check if we're close to the limit
-    if token_count > 6000:
-        print(f"⚠️ WARNING: Token count ({token_count}) is approaching or exceeding Groq's limit of 6000 TPM")
-        
-    response = llm.invoke(prompt)
+def _prepare_answer(user_query, retrieved_chunks, communication_language):
+    """
+    Everything generate_answer does before the LLM call.
+
+    Returns:
+        dict: {"cached": answer, "usage"} on an answer-cache hit, otherwise the
+            prompt, its token usage (see tokens.fit_chunks_to_budget) and the
+            keys needed to cache the answer afterwards.
+    """
+    # Skip the LLM entirely if an equivalent question was already answered
+    query_embedding = embed_query(user_query)
+    retrieved_key = context_key(retrieved_chunks)
+    cached_answer = answer_cache.get(query_embedding, communication_language, retrieved_key)
+    if cached_answer is not None:
+        metrics.inc("answers_total", source="cache")
+        return {"cached": cached_answer, "usage": {"source": "cache"}}
+
+    prompt_start = time.perf_counter()
+    fallback_response = FALLBACK_MESSAGES.get(communication_language, FALLBACK_MESSAGES["English"])
+
+    # Trim the context to the prompt budget instead of overrunning the TPM limit
+    overhead_tokens = count_tokens(build_prompt(user_query, "", communication_language, fallback_response))
+    retrieved_chunks, token_usage = fit_chunks_to_budget(retrieved_chunks, overhead_tokens)
+    chunk_context = "\n\n".join(retrieved_chunks)
+    prompt = build_prompt(user_query, chunk_context, communication_language, fallback_response)
+
+    metrics.observe("prompt_build", time.perf_counter() - prompt_start)
+    metrics.inc("prompt_chunks_dropped_total", token_usage["dropped_chunks"])
+    metrics.inc("prompt_chunks_truncated_total", token_usage["truncated_chunks"])
+
+    return {
+        "cached": None,
+        "prompt": prompt,
+        "prompt_tokens": token_usage["prompt_tokens"],
+        "usage": {"source": "llm", **token_usage},
+        "cache_args": (query_embedding, communication_language, retrieved_key),
+    }
+
+class AnswerStream:
+    """
+    Iterator over the text chunks of a streamed answer. usage holds the
+    prompt's token usage and gains "response_tokens" once the stream ends.
+    """
+
+    def __init__(self, chunks, usage):
+        self._chunks = chunks
+        self.usage = usage
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._chunks.__anext__()
+
+def _answer_message(content, usage):
+    from langchain_core.messages import AIMessage
+    return AIMessage(content=content, response_metadata={"prompt_usage": usage})
+
+def _record_response(prepared, answer):
+    prepared["usage"]["response_tokens"] = count_tokens(answer) if answer else 0
+
+async def agenerate_answer(user_query, retrieved_chunks, tab_data, communication_language, stream=False):
+    """
+    Generates an answer to the user's query using the LLaMA model (via ChatGroq).
+
+    With stream=True an AnswerStream of text chunks is returned instead of the
+    complete message, so the UI can render the answer as tokens arrive. Either
+    way the token usage comes with the answer: response_metadata["prompt_usage"]
+    on a message, .usage on a stream.
+    """
+    prepared = await asyncio.to_thread(_prepare_answer, user_query, retrieved_chunks, communication_language)
+    if prepared["cached"] is not None:
+        if stream:
+            return AnswerStream(_aiter_once(prepared["cached"]), prepared["usage"])
+        return _answer_message(prepared["cached"], prepared["usage"])
+
+    # Shared client; waits for TPM/RPM budget instead of hitting Groq's 429s
+    if stream:
+        return AnswerStream(_astream_answer(prepared), prepared["usage"])
+
+    with metrics.span("llm_total"):
+        response = await llm.ainvoke(prepared["prompt"], prepared["prompt_tokens"])
+    metrics.inc("answers_total", source="llm")
+    _record_response(prepared, response.content)
+    response.response_metadata["prompt_usage"] = prepared["usage"]
+    if response.content:
+        await asyncio.to_thread(answer_cache.put, *prepared["cache_args"], response.content)
+    return response
+
+def generate_answer(user_query, retrieved_chunks, tab_data, communication_language, stream=False):
+    """Blocking agenerate_answer; with stream=True the AnswerStream is a plain iterator"""
+    response = _run_sync(agenerate_answer(user_query, retrieved_chunks, tab_data, communication_language, stream))
+    if stream:
+        return AnswerStream(_iter_sync(response._chunks), response.usage)
     return response
 
-def count_tokens(text, model="cl100k_base"):
-    """Count the number of tokens in a text string using tiktoken"""
+async def aanswer_question(user_query, collection, communication_language, top_k=3):
+    """Retrieve and answer one question end to end without blocking the event loop"""
+    with metrics.span("total"):
+        retrieved_titles, retrieved_chunks, distances = await asearch_query(user_query, collection, top_k)
+        return await agenerate_answer(user_query, retrieved_chunks, None, communication_language)
+
+async def _astream_answer(prepared):
+    """Yield answer text as it arrives and cache the full answer once complete"""
+    parts = []
+    start = time.perf_counter()
+    async for chunk in llm.astream(prepared["prompt"], prepared["prompt_tokens"]):
+        if chunk.content:
+            if not parts:
+                metrics.observe("llm_ttft", time.perf_counter() - start)
+            parts.append(chunk.content)
+            yield chunk.content
+    metrics.observe("llm_total", time.perf_counter() - start)
+    metrics.inc("answers_total", source="llm")
+    answer = "".join(parts)
+    _record_response(prepared, answer)
+    if answer:
+        await asyncio.to_thread(answer_cache.put, *prepared["cache_args"], answer)
+
+async def _aiter_once(text):
+    yield text
+
+async def _anext(chunks):
+    return await chunks.__anext__()
+
+def _iter_sync(chunks):
+    """Drive an async iterator of answer chunks from synchronous code"""
+    done = False
     try:
-        encoder = tiktoken.get_encoding(model)
-        tokens = encoder.encode(text)
-        return len(tokens)
-    except Exception as e:
-        print(f"Error counting tokens: {e}")
-        # Rough estimation if tiktoken fails
-        return len(text.split()) * 1.3  # Rough estimate
\ No newline at end of file
+        while True:
+            try:
+                yield _run_sync(_anext(chunks))
+            except StopAsyncIteration:
+                done = True
+                return
+    finally:
+        # An abandoned stream still releases its rate-limiter slot
+        if not done:
+            _run_sync(chunks.aclose())
@@ -0,0 +1,254 @@
+import os
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Port for the Prometheus /metrics endpoint; 0 leaves it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Rolling window the p50/p95/p99 summaries are computed over
+METRICS_WINDOW_SECONDS = int(os.getenv("METRICS_WINDOW_SECONDS", "300"))
+# Samples kept per span for the rolling window
+METRICS_WINDOW_SIZE = int(os.getenv("METRICS_WINDOW_SIZE", "2048"))
+
+PREFIX = "jericho"
+# Seconds; the LLM spans need the long tail, embed and vector query the short end
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "answers_total": "Answers served, by source (llm or answer cache)",
+    "llm_tokens_total": "Tokens sent to and generated by the LLM",
+    "llm_rejected_total": "Questions turned away by the LLM rate limiter",
+    "prompt_chunks_dropped_total": "Retrieved chunks dropped to fit the prompt token budget",
+    "prompt_chunks_truncated_total": "Retrieved chunks cut short to fit the prompt token budget",
+    "routed_queries_total": "Questions by how the query router picked their shards (keywords, centroid or all)",
+}
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram plus a bounded window of recent
+    samples for rolling percentiles. observe() is a bisect and two appends
+    under a lock, cheap enough to leave on for every request.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window_seconds=METRICS_WINDOW_SECONDS, window_size=METRICS_WINDOW_SIZE):
+        self.buckets = buckets
+        self.window_seconds = window_seconds
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._recent = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.total += value
+            self.count += 1
+            self._recent.append((time.monotonic(), value))
+
+    def window(self):
+        """Percentiles over the samples of the last window_seconds"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            values = sorted(value for stamp, value in self._recent if stamp >= cutoff)
+        if not values:
+            return {"count": 0}
+
+        def percentile(q):
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        return {
+            "count": len(values),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": values[-1],
+        }
+
+    def exposition(self, name, labels):
+        with self._lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Registry:
+    """Spans, counters and gauge callbacks for the query pipeline"""
+
+    def __init__(self):
+        self.spans = {}      # span name -> Histogram
+        self.counters = {}   # (name, label items) -> value
+        self.help = dict(HELP)
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, span, seconds):
+        histogram = self.spans.get(span)
+        if histogram is None:
+            with self._lock:
+                histogram = self.spans.setdefault(span, Histogram())
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def register_collector(self, collect, help_text=None):
+        """
+        collect() -> [(name, labels dict, value)] is called on every scrape, for
+        gauges that already live elsewhere (cache hit ratios, limiter state).
+        """
+        with self._lock:
+            self.collectors.append(collect)
+            if help_text:
+                self.help.update(help_text)
+
+    def snapshot(self):
+        """Rolling-window latency percentiles (seconds) and counter totals"""
+        with self._lock:
+            spans = dict(self.spans)
+            counters = dict(self.counters)
+        return {
+            "spans": {span: histogram.window() for span, histogram in spans.items()},
+            "counters": {
+                name + "".join(f"[{k}={v}]" for k, v in labels): value
+                for (name, labels), value in counters.items()
+            },
+        }
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        name = f"{PREFIX}_span_seconds"
+        lines.append(f"# HELP {name} Time spent in each stage of answering a question")
+        lines.append(f"# TYPE {name} histogram")
+        with self._lock:
+            spans = dict(self.spans)
+            counters = dict(self.counters)
+            collectors = list(self.collectors)
+
+        for span, histogram in sorted(spans.items()):
+            lines.extend(histogram.exposition(name, f'span="{span}"'))
+
+        window_name = f"{PREFIX}_span_window_seconds"
+        lines.append(f"# HELP {window_name} Rolling {METRICS_WINDOW_SECONDS}s latency quantiles per stage")
+        lines.append(f"# TYPE {window_name} gauge")
+        for span, histogram in sorted(spans.items()):
+            window = histogram.window()
+            for quantile in ("p50", "p95", "p99"):
+                if quantile in window:
+                    lines.append(f'{window_name}{{span="{span}",quantile="{quantile}"}} {window[quantile]}')
+
+        seen = set()
+        for (counter, labels), value in sorted(counters.items()):
+            full_name = f"{PREFIX}_{counter}"
+            if full_name not in seen:
+                seen.add(full_name)
+                if counter in self.help:
+                    lines.append(f"# HELP {full_name} {self.help[counter]}")
+                lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name}{_labels(labels)} {value}")
+
+        for collect in collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+                continue
+            for gauge, labels, value in samples:
+                full_name = f"{PREFIX}_{gauge}"
+                if full_name not in seen:
+                    seen.add(full_name)
+                    if gauge in self.help:
+                        lines.append(f"# HELP {full_name} {self.help[gauge]}")
+                    lines.append(f"# TYPE {full_name} gauge")
+                lines.append(f"{full_name}{_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+registry = Registry()
+
+
+def observe(span, seconds):
+    if METRICS_ENABLED:
+        registry.observe(span, seconds)
+
+
+def inc(name, value=1, **labels):
+    if METRICS_ENABLED:
+        registry.inc(name, value, **labels)
+
+
+@contextmanager
+def span(name):
+    """Times the with-block into the named span"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start)
+
+
+def register_collector(collect, help_text=None):
+    registry.register_collector(collect, help_text)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT):
+    """
+    Serves registry.render() at /metrics from a daemon thread. Safe to call on
+    every Streamlit rerun: only the first call starts a server.
+    """
+    global _server
+    if not METRICS_ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"📈 Serving metrics on :{port}/metrics")
+    return _server
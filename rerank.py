@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+import embeddings
+
+load_dotenv()
+
+# Optional cross-encoder stage after retrieval
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+# The multilingual cross-encoder scores non-English questions against the English chunks
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+                         if embeddings.MULTILINGUAL_RETRIEVAL else "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates retrieved for the reranker to choose top_k from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Whole-query budget; reranking is skipped or cut short when it would run over
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "250"))
+
+_reranker = None
+_reranker_lock = threading.Lock()
+_predict_lock = threading.Lock()
+# Moving average of scoring cost per (query, chunk) pair, seeded pessimistically
+_ms_per_pair = 10.0
+# Applied to the estimate whenever a query skips reranking, so one slow batch
+# cannot switch reranking off for good: the estimate shrinks until a batch
+# runs again and is measured
+RERANK_ESTIMATE_DECAY = float(os.getenv("RERANK_ESTIMATE_DECAY", "0.9"))
+# Stands in for a retrieved chunk when timing the warm-up batch
+_WARM_UP_PASSAGE = " ".join(["Students may appeal a final grade through the academic standards committee."] * 18)
+
+
+def get_reranker():
+    """Returns the process-wide CPU cross-encoder, loading it on first use"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                from sentence_transformers import CrossEncoder
+                print(f"🧠 Loading reranker {RERANK_MODEL}")
+                _reranker = CrossEncoder(RERANK_MODEL, device="cpu")
+    return _reranker
+
+
+def rerank_results(query, results, top_n, elapsed_ms=0.0, budget_ms=RERANK_LATENCY_BUDGET_MS):
+    """
+    Reorders the first query of a Chroma-shaped result by cross-encoder score
+    and keeps the best top_n.
+
+    Candidates are scored in batches while the budget allows. If the first batch
+    is already predicted to overrun, the dense order is kept. If the budget runs
+    out part way, unscored candidates follow the scored ones in their original
+    order.
+
+    Args:
+        query (str): The user question.
+        results (dict): {"ids", "documents", "metadatas", "distances"} as returned by a backend.
+        top_n (int): Number of chunks to keep.
+        elapsed_ms (float): Time the query has already spent before reranking.
+        budget_ms (float): Total per-query latency budget.
+    """
+    global _ms_per_pair
+    start = time.perf_counter()
+    documents = results["documents"][0]
+    order = list(range(len(documents)))
+
+    if len(documents) > top_n:
+        model = get_reranker()
+        scores = {}
+        for batch_start in range(0, len(documents), RERANK_BATCH_SIZE):
+            batch = order[batch_start:batch_start + RERANK_BATCH_SIZE]
+            spent = elapsed_ms + (time.perf_counter() - start) * 1000
+            if spent + len(batch) * _ms_per_pair > budget_ms:
+                print(f"⏱️ Rerank budget reached after {len(scores)} of {len(documents)} candidates")
+                break
+            with _predict_lock:
+                # Timed inside the lock so waiting for another query is not counted as scoring cost
+                batch_start_time = time.perf_counter()
+                batch_scores = model.predict([(query, documents[i]) for i in batch], batch_size=RERANK_BATCH_SIZE)
+                per_pair = (time.perf_counter() - batch_start_time) * 1000 / len(batch)
+            _ms_per_pair = 0.8 * _ms_per_pair + 0.2 * per_pair
+            scores.update(zip(batch, (float(score) for score in batch_scores)))
+
+        if scores:
+            scored = sorted(scores, key=scores.get, reverse=True)
+            order = scored + [i for i in order if i not in scores]
+        else:
+            _ms_per_pair *= RERANK_ESTIMATE_DECAY
+
+    keep = order[:top_n]
+    return {key: [[results[key][0][i] for i in keep]] for key in ("ids", "documents", "metadatas", "distances")}
+
+
+def warm_up():
+    """
+    Loads the cross-encoder, runs one throwaway prediction, then times a full
+    batch of RERANK_CANDIDATES chunk-length pairs to seed the per-pair cost.
+    A single cold pair would mostly measure fixed per-call overhead.
+    """
+    global _ms_per_pair
+    model = get_reranker()
+    pairs = [("How do I appeal a grade?", _WARM_UP_PASSAGE)] * RERANK_CANDIDATES
+    with _predict_lock:
+        model.predict(pairs[:1])
+        start = time.perf_counter()
+        model.predict(pairs, batch_size=RERANK_BATCH_SIZE)
+        _ms_per_pair = (time.perf_counter() - start) * 1000 / len(pairs)
+    print("🔥 Reranker warmed up")
+    return model
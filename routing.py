@@ -0,0 +1,221 @@
+import os
+import re
+import json
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# Search only the shards a question is routed to; off searches all of them
+QUERY_ROUTING = os.getenv("QUERY_ROUTING", "true").lower() in ("1", "true", "yes")
+# Centroid routing: shards within this cosine margin of the closest one are searched too
+ROUTER_CENTROID_MARGIN = float(os.getenv("ROUTER_CENTROID_MARGIN", "0.05"))
+ROUTER_MAX_SHARDS = int(os.getenv("ROUTER_MAX_SHARDS", "2"))
+# Questions less similar than this to every centroid search all shards
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.15"))
+
+# Shard for documents no rule matches (the college's own pages)
+DEFAULT_SHARD = "academic_policies"
+
+# Shard -> who it is for, where its documents come from and what routes a
+# question to it. "origins" match the document store's source column (page
+# URL or "hr_policies"); "title" catches documents migrated from tab_data.json,
+# which carry no origin. Keywords are regexes matched at a word start.
+SHARDS = {
+    "hr_policies": {
+        "audience": "employee",
+        "origins": ("hr_policies",),
+        "title": r"hr_policies",
+        "keywords": (
+            r"employees?", r"employment", r"staff", r"supervisor", r"payroll", r"salar", r"wages?",
+            r"overtime", r"annual leave", r"sick leave", r"leave of absence", r"vacation", r"holidays?",
+            r"retirement", r"401", r"pension", r"benefits?", r"health plan", r"insurance", r"dental",
+            r"travel", r"per diem", r"reimburse", r"purchas", r"procurement", r"vendors?", r"hir(e|ing)",
+            r"terminat", r"resign", r"grievance", r"disciplinary", r"timesheet", r"personnel", r"hr\b",
+        ),
+    },
+    "ferpa": {
+        "audience": "student",
+        "origins": ("studentprivacy.ed.gov",),
+        "title": r"^§\s*99\.|ferpa|personally identifiable",
+        "keywords": (
+            r"ferpa", r"education records?", r"student records?", r"directory information", r"disclos",
+            r"redisclos", r"consent", r"privacy", r"personally identifiable", r"eligible student",
+            r"inspect", r"amend",
+        ),
+    },
+    "civil_rights": {
+        "audience": "student",
+        "origins": ("ed.gov/laws-and-policy/civil-rights",),
+        "title": r"civil rights|complaint|title vi|equal education|\(ocr\)",
+        "keywords": (
+            r"civil rights", r"discriminat", r"title vi", r"title ix", r"section 504", r"disabilit",
+            r"harass", r"ocr\b", r"office for civil rights", r"equal (education|opportunity)",
+            r"national origin", r"retaliat", r"complaints?",
+        ),
+    },
+    "federal_aid": {
+        "audience": "federal-aid",
+        "origins": ("ed.gov/higher-education",),
+        "title": r"fafsa|financial aid|verification|recertification|program reviews?",
+        "keywords": (
+            r"fafsa", r"financial aid", r"student aid", r"federal aid", r"pell", r"grants?", r"loans?",
+            r"verification", r"recertification", r"scholarships?", r"student aid index", r"sai\b",
+        ),
+    },
+    DEFAULT_SHARD: {
+        "audience": "student",
+        "origins": ("dinecollege.edu",),
+        "title": None,
+        "keywords": (
+            r"grad(e|es|ing)\b", r"gpa", r"graduat", r"degree", r"transcripts?", r"courses?", r"class(es)?\b",
+            r"credits?", r"semester", r"enroll", r"registr", r"withdraw", r"probation", r"suspension",
+            r"dean'?s list", r"honors?", r"attendance", r"military", r"veterans?", r"academic", r"majors?",
+            r"catalog", r"student conduct", r"appeal", r"incomplete",
+        ),
+    },
+}
+
+# Bump when the tagging rules change so existing chunks are re-tagged
+TAGGER_VERSION = "sources-v1"
+
+_KEYWORD_RES = {
+    shard: re.compile(r"\b(?:" + "|".join(rule["keywords"]) + ")", re.IGNORECASE)
+    for shard, rule in SHARDS.items()
+}
+_TITLE_RES = {
+    shard: re.compile(rule["title"], re.IGNORECASE)
+    for shard, rule in SHARDS.items() if rule["title"]
+}
+
+# The keyword tables are English; their word prefixes also match words of other
+# languages ("registr" in "registros"), so only English questions use them
+_ENGLISH_WORDS = {
+    "what", "how", "who", "when", "where", "which", "why", "is", "are", "do", "does", "did", "can",
+    "could", "should", "the", "my", "i", "to", "of", "for", "if", "get", "about", "with", "after",
+}
+_OTHER_WORDS = {
+    "qué", "que", "cómo", "como", "quién", "cuándo", "dónde", "cuál", "cuánto", "cuántos", "el", "la",
+    "los", "las", "del", "un", "una", "es", "mi", "mis", "por", "para", "puedo", "se", "le", "les",
+    "des", "est", "je", "mon", "ma", "pour", "quel", "quelle", "comment", "où", "du", "une",
+}
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def is_english(text):
+    """
+    Cheap check on function words and accented letters. Short keyword-only
+    questions ("FAFSA deadline?") count as English.
+    """
+    if "¿" in text or "¡" in text:
+        return False
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    english = sum(word in _ENGLISH_WORDS for word in words)
+    other = sum(word in _OTHER_WORDS for word in words)
+    if other > english:
+        return False
+    return english > 0 or text.isascii()
+
+
+def keyword_scores(text):
+    """Number of distinct keywords of each shard that occur in the text"""
+    scores = {}
+    for shard, pattern in _KEYWORD_RES.items():
+        hits = {match.group(0).lower() for match in pattern.finditer(text)}
+        if hits:
+            scores[shard] = len(hits)
+    return scores
+
+
+def tag_document(title, content="", origin=None):
+    """
+    Shard and audience of a document, from its origin when known, else its
+    title, else whichever shard's keywords occur most often in its content.
+
+    Args:
+        title (str): Document title.
+        content (str): Document text.
+        origin (str, optional): The document store's source column.
+
+    Returns:
+        dict: {"source": shard, "audience": audience}, merged into each chunk's metadata.
+    """
+    shard = None
+    if origin:
+        shard = next((name for name, rule in SHARDS.items()
+                      if any(marker in origin for marker in rule["origins"])), None)
+    if shard is None:
+        shard = next((name for name, pattern in _TITLE_RES.items() if pattern.search(title)), None)
+    if shard is None and content:
+        counts = {name: len(pattern.findall(content)) for name, pattern in _KEYWORD_RES.items()}
+        best = max(counts, key=counts.get)
+        shard = best if counts[best] else None
+    shard = shard or DEFAULT_SHARD
+    return {"source": shard, "audience": SHARDS[shard]["audience"]}
+
+
+def load_centroids(path):
+    """Shard -> unit centroid vector, as written by vectorstore.build_shadow_index"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class QueryRouter:
+    """
+    Picks the shards a question is searched in. Keyword rules go first for
+    English questions; other languages, and questions without a keyword, fall
+    back to the cosine similarity of their embedding with each shard's
+    centroid. Anything the router is unsure about searches every shard, so
+    routing can narrow a search but never empty it.
+    """
+
+    def __init__(self, shards, centroids=None):
+        self.shards = list(shards)
+        self.centroids = {shard: vector for shard, vector in (centroids or {}).items() if shard in self.shards}
+        self._matrix = None
+
+    def by_keywords(self, query_text):
+        scores = {shard: score for shard, score in keyword_scores(query_text).items() if shard in self.shards}
+        if not scores:
+            return []
+        best = max(scores.values())
+        return sorted(shard for shard, score in scores.items() if score == best)
+
+    def by_centroid(self, query_embedding):
+        import numpy as np
+
+        if not self.centroids:
+            return []
+        if self._matrix is None:
+            self._names = list(self.centroids)
+            self._matrix = np.asarray([self.centroids[name] for name in self._names], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = self._matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        if best < ROUTER_MIN_SIMILARITY:
+            return []
+        return [self._names[i] for i in order[:ROUTER_MAX_SHARDS]
+                if similarities[i] >= best - ROUTER_CENTROID_MARGIN]
+
+    def route(self, query_text=None, query_embedding=None):
+        """
+        Non-English questions skip the keyword rules and go by centroid.
+
+        Returns:
+            list or None: Shards to search, or None to search all of them.
+        """
+        if not QUERY_ROUTING or len(self.shards) < 2:
+            return None
+        shards = self.by_keywords(query_text) if query_text and is_english(query_text) else []
+        method = "keywords"
+        if not shards and query_embedding is not None:
+            shards = self.by_centroid(query_embedding)
+            method = "centroid"
+        if not shards or len(shards) == len(self.shards):
+            metrics.inc("routed_queries_total", method="all")
+            return None
+        metrics.inc("routed_queries_total", method=method)
+        return shards
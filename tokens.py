@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_ENCODING = "cl100k_base"
+# Llama3-8b-8192 context window and the max_tokens reserved for the answer
+CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "4192"))
+# Groq tokens-per-minute limit for the account
+TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+# Largest prompt we send: whatever fits the window next to the answer, capped by the TPM limit
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", str(min(CONTEXT_WINDOW - MAX_OUTPUT_TOKENS, TPM_LIMIT))))
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model=DEFAULT_ENCODING):
+    """Returns the tiktoken encoding, loaded once per process"""
+    import tiktoken
+    return tiktoken.get_encoding(model)
+
+
+def _estimate(text):
+    # Rough estimation if tiktoken fails
+    return int(len(text.split()) * 1.3)
+
+
+def count_tokens(text, model=DEFAULT_ENCODING):
+    """Count the number of tokens in a text string using tiktoken"""
+    try:
+        return len(get_encoder(model).encode(text))
+    except Exception as e:
+        print(f"Error counting tokens: {e}")
+        return _estimate(text)
+
+
+def count_tokens_batch(texts, model=DEFAULT_ENCODING):
+    """Count tokens for several texts in one encode_batch call"""
+    if not texts:
+        return []
+    try:
+        return [len(tokens) for tokens in get_encoder(model).encode_batch(list(texts))]
+    except Exception as e:
+        print(f"Error counting tokens: {e}")
+        return [_estimate(text) for text in texts]
+
+
+def truncate_to_tokens(text, max_tokens, model=DEFAULT_ENCODING):
+    """Cut text down to its first max_tokens tokens"""
+    encoder = get_encoder(model)
+    return encoder.decode(encoder.encode(text)[:max(max_tokens, 0)])
+
+
+def fit_chunks_to_budget(chunks, overhead_tokens, budget=None, model=DEFAULT_ENCODING):
+    """
+    Keeps retrieved chunks, best first, until the prompt would exceed the budget.
+    If even the first chunk does not fit it is truncated rather than dropped.
+
+    Args:
+        chunks (list[str]): Retrieved chunks in rank order.
+        overhead_tokens (int): Tokens of the prompt without any chunk context.
+        budget (int, optional): Max prompt tokens. Defaults to PROMPT_TOKEN_BUDGET.
+
+    Returns:
+        tuple: (kept_chunks, usage) where usage is a dict with the per-chunk
+            counts, context/prompt totals, the budget and how many chunks were
+            dropped or truncated.
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    # "\n\n" joining each chunk costs about one token
+    chunk_tokens = [n + 1 for n in count_tokens_batch(chunks, model)]
+    available = budget - overhead_tokens
+
+    kept = []
+    used = 0
+    truncated = 0
+    for chunk, n_tokens in zip(chunks, chunk_tokens):
+        if used + n_tokens <= available:
+            kept.append(chunk)
+            used += n_tokens
+        elif not kept and available > 0:
+            kept.append(truncate_to_tokens(chunk, available - 1, model))
+            used = available
+            truncated = 1
+        else:
+            break
+
+    usage = {
+        "chunk_tokens": chunk_tokens,
+        "context_tokens": used,
+        "prompt_tokens": overhead_tokens + used,
+        "budget": budget,
+        "kept_chunks": len(kept),
+        "dropped_chunks": len(chunks) - len(kept),
+        "truncated_chunks": truncated,
+    }
+    return kept, usage
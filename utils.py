@@ -1,27 +1,32 @@
-import os, re
-import json
+import re
 import requests
-from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
-import faiss
-from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from bs4 import BeautifulSoup, NavigableString
 from urllib.parse import urljoin
 from collections import defaultdict
-import torch
-from PyPDF2 import PdfReader
+import embeddings
+import chunking
+import docstore
 
-def get_data_from_website(url):
+# Seconds to wait for a scraped page before giving up
+REQUEST_TIMEOUT = 30
+
+def get_data_from_website(url, store=None):
     """
-    Fetches data from a website and saves it as a JSON file.
+    Fetches the Diné College policy tabs and writes them to the document store.
     """
-    response = requests.get(url)
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code == 500:
         print("Server error")
         return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    tab_data = parse_tab_data(response.content, url)
+    _store_documents(tab_data, url, store)
+
+def parse_tab_data(content, url=None):
+    """
+    Parses the elementor tabs of a Diné College page into a {title: content} dict.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
     tab_titles = soup.find_all("div", class_="elementor-tab-title")
     tab_data = {}
 
@@ -32,28 +37,30 @@ def get_data_from_website(url):
         tab_content = matching_content.get_text(separator="\n", strip=True) if matching_content else ""
         tab_data[tab_title] = tab_content
 
-    os.makedirs("data", exist_ok=True)
-    with open("data/tab_data.json", "w", encoding="utf-8") as f:
-        json.dump(tab_data, f, ensure_ascii=False, indent=2)
-    print("Data saved to data/tab_data.json")
+    return tab_data
 
-def append_ferpa_data(url, output_filename="data//tab_data.json"):
+def append_ferpa_data(url, store=None):
     """
-    Fetches data from a FERPA-related website, processes it, and appends it to a JSON file.
+    Fetches data from a FERPA-related website, processes it, and writes it to the document store.
 
     Args:
         url (str): The URL of the website to scrape.
-        output_filename (str, optional): The name of the JSON file to save/append data to.
-            Defaults to "data//tab_data.json".
+        store (DocumentStore, optional): Defaults to the shared document store.
     """
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    _store_documents(parse_ferpa_data(response.content, url), url, store)
+
+def parse_ferpa_data(content, url=None):
+    """
+    Parses FERPA question/answer sections into a {question: answer} dict.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
 
     data = {}
     h3_tags = soup.find_all('h3')
@@ -75,25 +82,30 @@ def append_ferpa_data(url, output_filename="data//tab_data.json"):
         if len(modified_value.split()) >= 5:
             modified_data[new_key] = modified_value
 
-    _append_to_json(modified_data, output_filename)
+    return modified_data
 
-def append_civil_rights_data(url, output_filename="data//tab_data.json"):
+def append_civil_rights_data(url, store=None):
     """
-    Fetches data from a civil rights laws website, processes it, and appends it to a JSON file.
+    Fetches data from a civil rights laws website, processes it, and writes it to the document store.
 
     Args:
         url (str): The URL of the website to scrape.
-        output_filename (str, optional): The name of the JSON file to save/append data to.
-            Defaults to "data//tab_data.json".
+        store (DocumentStore, optional): Defaults to the shared document store.
     """
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    _store_documents(parse_civil_rights_data(response.content, url), url, store)
+
+def parse_civil_rights_data(content, url=None):
+    """
+    Parses the civil rights laws hero text and cards into a {title: summary} dict.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
 
     final_data = {}
 
@@ -127,25 +139,30 @@ def append_civil_rights_data(url, output_filename="data//tab_data.json"):
                 link = href
             final_data[card_title] = f"{card_summary} link :- {link}".strip()
 
-    _append_to_json(final_data, output_filename)
+    return final_data
 
-def append_file_complaint_data(url, output_filename="data//tab_data.json"):
+def append_file_complaint_data(url, store=None):
     """
-    Fetches data from the file a complaint website, processes it, and appends it to a JSON file.
+    Fetches data from the file a complaint website, processes it, and writes it to the document store.
 
     Args:
         url (str): The URL of the website to scrape.
-        output_filename (str, optional): The name of the JSON file to save/append data to.
-            Defaults to "data//tab_data.json".
+        store (DocumentStore, optional): Defaults to the shared document store.
     """
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    _store_documents(parse_file_complaint_data(response.content, url), url, store)
+
+def parse_file_complaint_data(content, url=None):
+    """
+    Parses the file-a-complaint page into a single {heading: text} entry.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
 
     # Remove unnecessary tags
     for tag in soup(["script", "style", "footer", "nav", "header", "aside"]):
@@ -203,7 +220,7 @@ def append_file_complaint_data(url, output_filename="data//tab_data.json"):
     # Result dict
     result = {key: value}
 
-    _append_to_json(result, output_filename)
+    return result
 
 def extract_table_as_text(table):
     rows = []
@@ -261,20 +278,32 @@ def extract_h3_with_paragraphs(soup):
                 result[heading_text] = paragraph_text
     return result
 
-def append_fafsa_data(url, output_filename="data/tab_data.json"):
+def append_fafsa_data(url, store=None):
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return
 
+    result = parse_fafsa_data(response.content, url)
+    if result is None:
+        return
+
+    _store_documents(result, url, store)
+    return result
+
+def parse_fafsa_data(content, url):
+    """
+    Parses the FAFSA page headings, paragraphs, tables, lists and panels into a dict.
+    Returns None when the content container is missing.
+    """
     base_url = url
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = BeautifulSoup(content, 'html.parser')
     container = soup.find('div', class_='field field--name-body field--type-text-with-summary field--label-hidden field__item')
     if not container:
         print("No content container found.")
-        return
+        return None
 
     result = defaultdict(str)
     current_header = None
@@ -320,101 +349,52 @@ def append_fafsa_data(url, output_filename="data/tab_data.json"):
         else:
             result[heading] = paragraph
 
-    os.makedirs(os.path.dirname(output_filename), exist_ok=True)
-    _append_to_json(result, output_filename)
-    print(f"Data appended to {output_filename}")
-    return result
+    return dict(result)
 
-def _append_to_json(new_data, output_filename):
+def _store_documents(new_data, url, store=None):
     """
-    Appends a dictionary of data to an existing JSON file or creates a new one.
+    Writes scraped {title: content} data to the document store, the same way
+    ingest.run_ingestion does; the index picks it up on its next refresh.
 
     Args:
-        new_data (dict): The dictionary data to append.
-        output_filename (str): The name of the JSON file.
+        new_data (dict): The scraped documents.
+        url (str): The page they came from, stored as their source.
+        store (DocumentStore, optional): Defaults to the shared document store.
     """
-    try:
-        with open(output_filename, 'r+', encoding='utf-8') as f:
-            try:
-                existing_data = json.load(f)
-                existing_data.update(new_data)
-                f.seek(0)
-                json.dump(existing_data, f, ensure_ascii=False, indent=4)
-                f.truncate() # Remove remaining part if new data is shorter
-            except json.JSONDecodeError:
-                print("Error decoding existing JSON file. Overwriting with new data.")
-                f.seek(0)
-                json.dump(new_data, f, ensure_ascii=False, indent=4)
-                f.truncate()
-    except FileNotFoundError:
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            json.dump(new_data, f, ensure_ascii=False, indent=4)
+    store = docstore.get_docstore() if store is None else store
+    changed = store.put_documents(new_data, source=url)
+    print(f"💾 Stored {len(changed)} changed of {len(new_data)} documents from {url}")
 
 
 def generate_embeddings(documents):
     """
-    Generates embeddings for a list of documents using a SentenceTransformer model.
+    Generates embeddings for a list of documents using the shared SentenceTransformer model.
+    The model is loaded once per process (see embeddings.get_embedding_model).
     """
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    model = model.to(device)
-    embeddings = model.encode(documents, convert_to_numpy=True, show_progress_bar=True)
-    return embeddings
+    return embeddings.encode(documents)
 
 
-def create_faiss_index(embeddings):
+def get_model():
+    return embeddings.get_embedding_model()
+    
+def get_data_from_pdf(pdf_directory, store=None):
     """
-    Creates and saves a FAISS index for the given embeddings.
+    Extracts every PDF in pdf_directory into the document store.
+    Unchanged PDFs are skipped; see ingest.ingest_pdfs.
     """
-    embedding_dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(embedding_dim)  # L2 distance metric
-    index.add(embeddings)
-    faiss.write_index(index, 'data/faiss_index.idx')
+    from ingest import ingest_pdfs
+    return ingest_pdfs(pdf_directory, store)
 
-    return index
-
-
-def load_faiss_index():
-    """
-    Loads the saved FAISS index.
+def extract_pdf_pages(pdf_path):
     """
-    index = faiss.read_index('data/faiss_index.idx')
-    return index
+    Extracts text page by page from a PDF.
 
-
-def load_metadata():
-    """
-    Loads the metadata (e.g., tab titles) used for reverse lookup in FAISS index.
+    Returns:
+        list: (page_number, text) tuples, page numbers starting at 1.
     """
-    with open('data/faiss_metadata.json', 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
-    return metadata
-
-def get_model():
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-    return model
-    
-def get_data_from_pdf(pdf_directory,output_filename="data/tab_data.json"):
-
-    all_files=os.listdir(pdf_directory)
-    all_pdf_files=[x for x in all_files if "pdf" in x]
-    all_pdf_files_path=[os.path.join(pdf_directory,x) for x in all_pdf_files]
-    # all_pdf_files_path
-    
-    for pdf_path in all_pdf_files_path:
-        print(pdf_path)
-        text=""
-
-        filename =pdf_path.split("/")[-1]
-        pdf_reader=PdfReader(pdf_path)
-
-        for page in pdf_reader.pages:
-            text+=page.extract_text()
-    
-        print({filename:text})
-
-        _append_to_json({filename:text},output_filename)
+    from PyPDF2 import PdfReader
+    pdf_reader = PdfReader(pdf_path)
+    return [(page_number, page.extract_text() or "") for page_number, page in enumerate(pdf_reader.pages, start=1)]
 
 
 def clean_text(text):
@@ -423,20 +403,27 @@ def clean_text(text):
     text = re.sub(r'[\r\n\t]', ' ', text)  # remove line breaks
     return text.strip()
 
-def chunk_text(text, max_words=200):
-    words = text.split()
-    return [' '.join(words[i:i+max_words]) for i in range(0, len(words), max_words)]
+def chunk_text(text, title=""):
+    """
+    Splits text into model-token-sized chunks; see chunking.split_text.
+    """
+    return chunking.split_text(text, title)
 
 
 def preprocess_tab_data(tab_data):
+    """
+    Chunks every document the same way the vectorstore does.
+
+    Returns:
+        tuple: (chunks, titles) with the title of each chunk.
+    """
     cleaned_chunks = []
     metadata = []
 
     for title, content in tab_data.items():
-        cleaned = clean_text(content)
-        chunks = chunk_text(cleaned, max_words=200)
-        cleaned_chunks.extend(chunks)
-        metadata.extend([title] * len(chunks))
+        for _, chunk, chunk_metadata in chunking.chunk_document(title, content):
+            cleaned_chunks.append(chunk)
+            metadata.append(chunk_metadata["title"])
 
     return cleaned_chunks, metadata
 
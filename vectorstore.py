@@ -0,0 +1,891 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import chromadb
+from dotenv import load_dotenv
+import embeddings
+import docstore
+import backends
+import chunking
+import routing
+import metrics
+import lexical
+from lexical import BM25Index
+from docstore import calculate_document_hash
+
+load_dotenv()
+
+# On-disk ChromaDB location and collection name
+CHROMA_PATH = os.getenv("CHROMA_PATH", "data/chroma")
+COLLECTION_NAME = "jericho_documents"
+
+# Bookkeeping files
+METADATA_FILE = "data/metadata.json"
+# Per-title content hash and chunk IDs of the pre-versioning jericho_documents collection
+MANIFEST_FILE = "data/index_manifest.json"
+# Which versioned collection is live, with its manifest and BM25 index
+ACTIVE_INDEX_FILE = "data/active_index.json"
+INDEX_DIR = "data/indexes"
+# Seconds between checks for changed documents while serving
+INDEX_REFRESH_INTERVAL = int(os.getenv("INDEX_REFRESH_INTERVAL", "300"))
+# Seconds a swapped-out collection is kept for queries still running against it
+INDEX_RETIRE_DELAY = int(os.getenv("INDEX_RETIRE_DELAY", "120"))
+
+# Seconds after which a build lock held by a process on another host is
+# presumed abandoned; locks of this host are stale once their process exits
+INDEX_BUILD_LOCK_TIMEOUT = int(os.getenv("INDEX_BUILD_LOCK_TIMEOUT", "3600"))
+
+# Chunks encoded and added to the collection per step of an index build
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+
+# Store each source (routing.SHARDS) in its own collection, <name>__<shard>
+SHARD_BY_SOURCE = os.getenv("SHARD_BY_SOURCE", "true").lower() in ("1", "true", "yes")
+SHARD_SEPARATOR = "__"
+# Vectors of a different model or normalization live in a different space
+EMBEDDING_SPACE = f"{embeddings.EMBEDDING_MODEL_NAME}:{'unit' if embeddings.EMBEDDING_NORMALIZE else 'raw'}"
+# Everything that decides how documents end up in a collection; an index built
+# with a different layout is rebuilt
+INDEX_LAYOUT = (f"{EMBEDDING_SPACE}:{chunking.CHUNKER_VERSION}:{routing.TAGGER_VERSION}:"
+                f"{'sharded' if SHARD_BY_SOURCE else 'flat'}")
+
+_chroma_client = None
+
+
+def get_client():
+    """Returns the persistent ChromaDB client, creating it on first use"""
+    global _chroma_client
+    if _chroma_client is None:
+        os.makedirs(CHROMA_PATH, exist_ok=True)
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _chroma_client
+
+
+def get_collection(name=COLLECTION_NAME):
+    """
+    Returns the persistent ChromaDB collection, creating the client on first use.
+    """
+    return get_client().get_or_create_collection(name=name)
+
+
+def list_collection_names():
+    # Chroma returns names from 0.6 on and Collection objects before that
+    return [getattr(collection, "name", collection) for collection in get_client().list_collections()]
+
+
+class ShardedCollection:
+    """
+    One logical collection stored as a ChromaDB collection per source shard
+    (<name>__<shard>, the "source" of each chunk's metadata), so a question
+    routed to one shard only searches that shard's HNSW graph and search cost
+    grows with the shard rather than the whole corpus. Mirrors the collection
+    methods the index code uses: add, get, update, delete, count and query.
+    """
+
+    def __init__(self, name, client=None):
+        self.name = name
+        self.client = client or get_client()
+        self._prefix = f"{name}{SHARD_SEPARATOR}"
+        self._shards = {}
+        self._counts = {}
+        for collection in self.client.list_collections():
+            collection_name = getattr(collection, "name", collection)
+            if collection_name.startswith(self._prefix):
+                self._shards[collection_name[len(self._prefix):]] = self.client.get_collection(collection_name)
+
+    def shard_names(self):
+        return sorted(self._shards)
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            self._shards[shard] = self.client.get_or_create_collection(name=f"{self._prefix}{shard}")
+        return self._shards[shard]
+
+    def _shard_count(self, shard):
+        # Served indexes never change, so counts are only re-read after a write
+        if shard not in self._counts:
+            self._counts[shard] = self._shards[shard].count()
+        return self._counts[shard]
+
+    def count(self):
+        return sum(self._shard_count(shard) for shard in self._shards)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(metadata.get("source") or routing.DEFAULT_SHARD, []).append(i)
+        for shard, rows in groups.items():
+            self._shard(shard).add(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+            self._counts.pop(shard, None)
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        """By ids, or a page over all shards in shard order"""
+        include = list(include)
+        results = {"ids": [], **{key: [] for key in include}}
+
+        def extend(batch):
+            results["ids"].extend(batch["ids"])
+            for key in include:
+                results[key].extend(batch[key])
+
+        if ids is not None:
+            for collection in self._shards.values():
+                extend(collection.get(ids=list(ids), include=include))
+            return results
+
+        remaining = limit
+        for shard in self.shard_names():
+            size = self._shard_count(shard)
+            if offset >= size:
+                offset -= size
+                continue
+            batch = self._shards[shard].get(include=include, limit=remaining, offset=offset)
+            extend(batch)
+            offset = 0
+            if remaining is not None:
+                remaining -= len(batch["ids"])
+                if remaining <= 0:
+                    break
+        return results
+
+    def update(self, ids, metadatas):
+        """Updates metadata in place, moving chunks whose source changed to their new shard"""
+        target = dict(zip(ids, metadatas))
+        for shard, collection in list(self._shards.items()):
+            found = collection.get(ids=list(ids), include=[])["ids"]
+            stay = [chunk_id for chunk_id in found if (target[chunk_id].get("source") or routing.DEFAULT_SHARD) == shard]
+            move = [chunk_id for chunk_id in found if chunk_id not in set(stay)]
+            if stay:
+                collection.update(ids=stay, metadatas=[target[chunk_id] for chunk_id in stay])
+            if move:
+                moved = collection.get(ids=move, include=["embeddings", "documents"])
+                collection.delete(ids=moved["ids"])
+                self._counts.pop(shard, None)
+                self.add(moved["ids"], list(moved["embeddings"]), moved["documents"],
+                         [target[chunk_id] for chunk_id in moved["ids"]])
+
+    def delete(self, ids):
+        for shard, collection in self._shards.items():
+            collection.delete(ids=list(ids))
+            self._counts.pop(shard, None)
+
+    def query(self, query_embeddings, n_results=3, shards=None):
+        """
+        Searches the given shards (all when None) and merges the per-shard hits
+        by distance into one Chroma-shaped result.
+        """
+        names = [shard for shard in (shards or self.shard_names()) if shard in self._shards and self._shard_count(shard)]
+        rows = [[] for _ in query_embeddings]
+        for shard in names:
+            batch = self._shards[shard].query(query_embeddings=query_embeddings,
+                                              n_results=min(n_results, self._shard_count(shard)))
+            for row, hits in enumerate(rows):
+                hits.extend(zip(batch["distances"][row], batch["ids"][row],
+                                batch["documents"][row], batch["metadatas"][row]))
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for hits in rows:
+            hits = sorted(hits, key=lambda hit: hit[0])[:n_results]
+            results["distances"].append([hit[0] for hit in hits])
+            results["ids"].append([hit[1] for hit in hits])
+            results["documents"].append([hit[2] for hit in hits])
+            results["metadatas"].append([hit[3] for hit in hits])
+        return results
+
+    def centroids(self, batch_size=1024):
+        """Shard -> normalized mean embedding, for routing.QueryRouter"""
+        import numpy as np
+
+        centroids = {}
+        for shard in self.shard_names():
+            total = None
+            for offset in range(0, self._shard_count(shard), batch_size):
+                batch = self._shards[shard].get(include=["embeddings"], limit=batch_size, offset=offset)
+                vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                total = vectors.sum(axis=0) if total is None else total + vectors.sum(axis=0)
+            if total is not None:
+                centroids[shard] = (total / max(float(np.linalg.norm(total)), 1e-12)).tolist()
+        return centroids
+
+    def drop(self):
+        """Deletes every shard collection"""
+        for shard in list(self._shards):
+            self.client.delete_collection(f"{self._prefix}{shard}")
+        self._shards.clear()
+        self._counts.clear()
+
+
+def open_collection(info):
+    """The collection an active-index record describes: sharded or a single ChromaDB collection"""
+    if info.get("sharded"):
+        return ShardedCollection(info["collection"])
+    return get_collection(info["collection"])
+
+
+def calculate_file_hash(file_path):
+    """Calculate MD5 hash of file to detect changes"""
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def get_metadata():
+    """Load metadata from file or create default"""
+    if os.path.exists(METADATA_FILE):
+        with open(METADATA_FILE, 'r') as f:
+            return json.load(f)
+    else:
+        return {"tab_data_hash": "", "last_updated": ""}
+
+
+def save_metadata(metadata):
+    """Save metadata to file"""
+    _write_json(METADATA_FILE, metadata)
+
+
+def _write_json(path, data):
+    """Write JSON atomically so a crash or a concurrent reader never sees it half-written"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Load the per-title index manifest, or an empty one"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    _write_json(path, manifest)
+
+
+def diff_manifest(manifest, tab_data):
+    """
+    Compares tab_data against the manifest.
+
+    Returns:
+        tuple: (changed, removed) where changed maps title -> new document hash for
+            added or modified titles (or titles indexed with an older INDEX_LAYOUT) and
+            removed lists titles no longer in tab_data.
+    """
+    changed = {}
+    for title, content in tab_data.items():
+        doc_hash = calculate_document_hash(title, content)
+        entry = manifest.get(title)
+        if entry is None or entry.get("hash") != doc_hash or entry.get("chunker") != INDEX_LAYOUT:
+            changed[title] = doc_hash
+    removed = [title for title in manifest if title not in tab_data]
+    return changed, removed
+
+
+def index_chunks(collection, chunk_iter, batch_size=INDEX_BATCH_SIZE, processes=None):
+    """
+    Encodes chunks in fixed-size batches and adds each batch to the collection
+    as soon as it is ready, so memory stays bounded by one batch.
+
+    Args:
+        collection: ChromaDB collection to add to.
+        chunk_iter (iterable): (chunk_id, text, metadata) tuples.
+        batch_size (int): Chunks per encode + collection.add step.
+        processes (int, optional): Encode worker processes. Defaults to EMBEDDING_PROCESSES.
+
+    Returns:
+        int: Number of chunks added.
+    """
+    pool = embeddings.start_encode_pool(processes)
+    start = time.time()
+    added = 0
+    batch = []
+
+    def flush():
+        nonlocal added
+        ids, texts, metadatas = zip(*batch)
+        vectors = embeddings.encode(list(texts), pool=pool, show_progress_bar=False)
+        collection.add(
+            embeddings=vectors.tolist(),
+            documents=list(texts),
+            metadatas=list(metadatas),
+            ids=list(ids)
+        )
+        added += len(batch)
+        batch.clear()
+        elapsed = time.time() - start
+        print(f"⏳ Indexed {added} chunks ({added / max(elapsed, 1e-9):.1f} chunks/s)")
+
+    try:
+        for item in chunk_iter:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        embeddings.stop_encode_pool(pool)
+
+    return added
+
+
+def sync_collection(collection, tab_data, manifest=None, store=None, lexical_index=None, manifest_path=MANIFEST_FILE):
+    """
+    Brings the collection in line with tab_data by re-chunking only added or
+    changed titles and deleting the chunks of removed ones. Chunk IDs are
+    content hashes, so within a changed title only chunks whose text changed
+    are embedded again. Every chunk is tagged with its document's source shard
+    and audience (routing.tag_document).
+
+    Args:
+        collection: ChromaDB collection to update.
+        tab_data (Mapping): Title -> content mapping (a dict or a DocumentStore).
+        manifest (dict, optional): Current manifest. Loaded from disk when omitted.
+        store (DocumentStore, optional): Receives the new chunks for lookup by chunk ID.
+        lexical_index (BM25Index, optional): Updated with the same removals and additions.
+        manifest_path (str): Where the collection's manifest is kept.
+
+    Returns:
+        dict: The updated manifest.
+    """
+    if manifest is None:
+        manifest = load_manifest(manifest_path)
+
+    # A manifest without the matching vectors (e.g. deleted chroma dir) is useless
+    indexed = sum(len(entry["chunk_ids"]) for entry in manifest.values())
+    if indexed != collection.count():
+        print(f"⚠️ Manifest lists {indexed} chunks but collection has {collection.count()}. Rebuilding index.")
+        existing = collection.get(include=[])
+        if existing and existing.get('ids'):
+            collection.delete(ids=existing['ids'])
+        manifest = {}
+
+    changed, removed = diff_manifest(manifest, tab_data)
+    if not changed and not removed:
+        return manifest
+
+    print(f"💾 Re-indexing {len(changed)} changed and removing {len(removed)} deleted titles")
+
+    def drop(chunk_ids):
+        if chunk_ids:
+            collection.delete(ids=chunk_ids)
+            if lexical_index is not None:
+                lexical_index.remove(chunk_ids)
+
+    # Drop all chunks of removed titles
+    stale_ids = []
+    for title in removed:
+        stale_ids.extend(manifest.pop(title)["chunk_ids"])
+    drop(stale_ids)
+
+    def iter_changed_chunks():
+        # Chunk one title at a time so only the current batch is held in memory
+        for title, doc_hash in changed.items():
+            content = tab_data[title]
+            chunks = chunking.chunk_document(title, content, **routing.tag_document(title, content, _origin(tab_data, title)))
+            ids, texts, metadatas = (list(column) for column in zip(*chunks)) if chunks else ([], [], [])
+            previous_ids = set(manifest.get(title, {}).get("chunk_ids", []))
+            drop([chunk_id for chunk_id in previous_ids if chunk_id not in set(ids)])
+            # Unchanged chunks keep their vectors, only their position may have moved
+            kept = [chunk for chunk in chunks if chunk[0] in previous_ids]
+            if kept:
+                collection.update(ids=[c[0] for c in kept], metadatas=[c[2] for c in kept])
+            manifest[title] = {"hash": doc_hash, "chunk_ids": ids, "chunker": INDEX_LAYOUT}
+            if store is not None:
+                store.put_chunks(title, ids, texts, metadatas)
+            if lexical_index is not None:
+                lexical_index.add(ids, texts, metadatas)
+            yield from (chunk for chunk in chunks if chunk[0] not in previous_ids)
+
+    added = index_chunks(collection, iter_changed_chunks())
+
+    save_manifest(manifest, manifest_path)
+    print(f"✅ Added {added} chunks to ChromaDB collection")
+    return manifest
+
+
+def _origin(tab_data, title):
+    """Where a document came from (page URL, "hr_policies"), when tab_data is a DocumentStore"""
+    if not hasattr(tab_data, "get_document"):
+        return None
+    document = tab_data.get_document(title)
+    return document["source"] if document else None
+
+
+def backfill_chunks(collection, store):
+    """
+    Copies chunk texts from the collection into the document store, for indexes
+    that were built before the store kept chunks. Nothing is re-embedded.
+    """
+    results = collection.get(include=["documents", "metadatas"])
+    by_title = {}
+    for chunk_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+        by_title.setdefault(metadata['title'], []).append((metadata.get('chunk_index', 0), chunk_id, text, metadata))
+    for title, rows in by_title.items():
+        rows.sort(key=lambda row: row[0])
+        store.put_chunks(title, [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+    print(f"📦 Backfilled {len(results['ids'])} chunks into the document store")
+
+
+def copy_collection(source, target, batch_size=INDEX_BATCH_SIZE):
+    """Copies stored vectors, texts and metadata between collections without re-embedding"""
+    copied = 0
+    total = source.count()
+    while copied < total:
+        batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=copied)
+        if not batch["ids"]:
+            break
+        target.add(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"],
+        )
+        copied += len(batch["ids"])
+    return copied
+
+
+def load_active_index():
+    """
+    Record of the live collection: {"collection", "version", "chunker",
+    "model", "sharded", "manifest", "bm25", "centroids", "updated"}. Before
+    the first versioned build this describes the original jericho_documents
+    collection and its files.
+    """
+    if os.path.exists(ACTIVE_INDEX_FILE):
+        with open(ACTIVE_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {
+        "collection": COLLECTION_NAME,
+        "version": get_metadata().get("tab_data_hash", ""),
+        "chunker": None,
+        "model": None,
+        "sharded": False,
+        "manifest": MANIFEST_FILE,
+        "bm25": lexical.BM25_INDEX_FILE,
+        "centroids": None,
+        "updated": "",
+    }
+
+
+def build_shadow_index(store, base=None):
+    """
+    Indexes the store's current content into a new versioned collection. The
+    live collection is only read from: its vectors seed the new one, so only
+    chunks that changed since are embedded. Vectors of another embedding model
+    or normalization are never reused. The build holds build_lock(name), so
+    another process neither builds the same collection nor drops it meanwhile.
+
+    Args:
+        store (DocumentStore): Documents to index.
+        base (dict, optional): Active-index record of the live index to start from.
+
+    Returns:
+        dict: Active-index record for the new collection (see load_active_index).
+    """
+    version = store.version()
+    suffix = hashlib.md5(f"{version}:{INDEX_LAYOUT}".encode("utf-8")).hexdigest()[:12]
+    name = f"{COLLECTION_NAME}_{suffix}"
+    manifest_path = os.path.join(INDEX_DIR, f"{name}.manifest.json")
+    bm25_path = os.path.join(INDEX_DIR, f"{name}.bm25.json")
+    centroids_path = os.path.join(INDEX_DIR, f"{name}.centroids.json")
+
+    with build_lock(name):
+        # Leftovers of an interrupted build of the same version are not trusted
+        if base is None or base["collection"] != name:
+            _drop_collections(name)
+        shadow = open_collection({"collection": name, "sharded": SHARD_BY_SOURCE})
+
+        manifest = {}
+        lexical_index = BM25Index()
+        if base is not None and base["collection"] != name and base.get("model") == EMBEDDING_SPACE:
+            live = open_collection(base)
+            base_manifest = load_manifest(base["manifest"])
+            if live.count() and sum(len(entry["chunk_ids"]) for entry in base_manifest.values()) == live.count():
+                print(f"📋 Seeding {name} with {live.count()} vectors from {base['collection']}")
+                copy_collection(live, shadow)
+                manifest = base_manifest
+                lexical_index = BM25Index.load(base["bm25"])
+
+        manifest = sync_collection(shadow, store, manifest, store=store, lexical_index=lexical_index,
+                                   manifest_path=manifest_path)
+        save_manifest(manifest, manifest_path)
+        if store.chunk_count() != shadow.count():
+            backfill_chunks(shadow, store)
+        if len(lexical_index) != store.chunk_count():
+            print("💾 Rebuilding BM25 index from the document store")
+            lexical_index = BM25Index.from_store(store)
+        lexical_index.save(bm25_path)
+        if SHARD_BY_SOURCE:
+            _write_json(centroids_path, shadow.centroids())
+            print(f"🗂️ Indexed shards: {', '.join(f'{shard} ({shadow._shard_count(shard)})' for shard in shadow.shard_names())}")
+
+        return {
+            "collection": name,
+            "version": version,
+            "chunker": INDEX_LAYOUT,
+            "model": EMBEDDING_SPACE,
+            "sharded": SHARD_BY_SOURCE,
+            "manifest": manifest_path,
+            "bm25": bm25_path,
+            "centroids": centroids_path if SHARD_BY_SOURCE else None,
+            "updated": datetime.now().isoformat(),
+        }
+
+
+def _lock_path(name):
+    return os.path.join(INDEX_DIR, f"{name}.lock")
+
+
+def is_build_locked(name):
+    """
+    True while a live process holds the build lock of a collection. A lock of
+    this host is stale once its process has exited; one of another host after
+    INDEX_BUILD_LOCK_TIMEOUT seconds.
+    """
+    path = _lock_path(name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            owner = json.load(f)
+        age = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return False
+    except (OSError, json.JSONDecodeError):
+        # Being written right now, or left half-written by a crash
+        try:
+            return time.time() - os.path.getmtime(path) < 60
+        except OSError:
+            return False
+    if owner.get("host") != socket.gethostname():
+        return age < INDEX_BUILD_LOCK_TIMEOUT
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def build_lock(name):
+    """
+    Lock file in INDEX_DIR marking a collection as being built. Stale locks
+    are taken over.
+
+    Raises:
+        RuntimeError: If another live process is building the same collection.
+    """
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = _lock_path(name)
+    owner = json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "started": time.time()})
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if is_build_locked(name):
+                raise RuntimeError(f"{name} is already being built by another process")
+            print(f"🔓 Taking over the stale build lock of {name}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(owner)
+        break
+    else:
+        raise RuntimeError(f"Could not take the build lock of {name}")
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _drop_collections(name):
+    """Deletes a collection and any shard collections stored under its name"""
+    for collection_name in list_collection_names():
+        if collection_name == name or collection_name.startswith(f"{name}{SHARD_SEPARATOR}"):
+            get_client().delete_collection(collection_name)
+
+
+def retire_index(info):
+    """Drops a swapped-out collection (with its shards) and its manifest, BM25, centroid and FAISS files"""
+    try:
+        _drop_collections(info["collection"])
+        for path in (info.get("manifest"), info.get("bm25"), info.get("centroids"),
+                     *faiss_paths(info["collection"]).values()):
+            if path and os.path.exists(path):
+                os.remove(path)
+        print(f"🗑️ Retired collection {info['collection']}")
+    except Exception as e:
+        print(f"⚠️ Could not retire collection {info['collection']}: {e}")
+
+
+class IndexManager:
+    """
+    Owns the live search index. Serving always runs against a complete,
+    immutable collection; when the documents change a background worker builds
+    a shadow collection for the new version and swaps it in by replacing one
+    reference (and the ACTIVE_INDEX_FILE pointer on disk). The old collection
+    is dropped INDEX_RETIRE_DELAY seconds later, after in-flight queries finish.
+    """
+
+    def __init__(self, store=None):
+        self.store = docstore.get_docstore() if store is None else store
+        self.active = load_active_index()
+        self.backend = backends.SwappableBackend()
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._worker = None
+        self._last_check = 0.0
+
+    def start(self):
+        """
+        Serves the existing index straight away and schedules a rebuild if it
+        is out of date. Only blocks when there is no index at all yet.
+        """
+        if len(self.store) == 0 and os.path.exists(docstore.TAB_DATA_FILE):
+            docstore.migrate_from_json(self.store)
+
+        collection = open_collection(self.active)
+        if collection.count() == 0:
+            print("💾 No index yet, building it before serving")
+            self._rebuild()
+            return self
+
+        print(f"📚 Serving collection {self.active['collection']}")
+        self.backend.swap(get_search_backend(collection, self.store, bm25_path=self.active["bm25"],
+                                             centroids_path=self.active.get("centroids"),
+                                             version=self.active.get("version")))
+        self._drop_orphans()
+        self.refresh(force=True)
+        return self
+
+    def is_stale(self):
+        return (self.active.get("version") != self.store.version()
+                or self.active.get("chunker") != INDEX_LAYOUT)
+
+    def is_rebuilding(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def refresh(self, force=False):
+        """
+        Starts a background rebuild when the documents changed. Checks at most
+        every INDEX_REFRESH_INTERVAL seconds, so it is cheap to call per rerun.
+
+        Returns:
+            bool: True if a rebuild was started.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < INDEX_REFRESH_INTERVAL:
+            return False
+        with self._lock:
+            self._last_check = now
+            if self.is_rebuilding() or not self.is_stale():
+                return False
+            print("🔄 Documents changed, rebuilding the index in the background")
+            self._worker = threading.Thread(target=self._run, name="index-rebuild", daemon=True)
+            self._worker.start()
+        return True
+
+    def wait(self, timeout=None):
+        """Blocks until a running rebuild has finished"""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def status(self):
+        return {
+            "collection": self.active["collection"],
+            "version": self.active.get("version"),
+            "updated": self.active.get("updated"),
+            "rebuilding": self.is_rebuilding(),
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        try:
+            self._rebuild()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            metrics.inc("index_rebuilds_total", outcome="failed")
+            print(f"❌ Background index rebuild failed, still serving {self.active['collection']}: {e}")
+
+    def _rebuild(self):
+        start = time.time()
+        previous = self.active
+        info = build_shadow_index(self.store, base=previous)
+        backend = get_search_backend(open_collection(info), self.store, bm25_path=info["bm25"],
+                                     centroids_path=info["centroids"], version=info["version"])
+
+        # The swap: pointer file first so a restart picks up the same index
+        _write_json(ACTIVE_INDEX_FILE, info)
+        self.backend.swap(backend)
+        self.active = info
+        # metadata.json carries the data version the query caches are keyed on
+        save_metadata({"tab_data_hash": info["version"], "last_updated": info["updated"]})
+        metrics.inc("index_rebuilds_total", outcome="swapped")
+        print(f"🔁 Swapped in {info['collection']} after {time.time() - start:.1f}s")
+
+        if previous["collection"] != info["collection"]:
+            timer = threading.Timer(INDEX_RETIRE_DELAY, retire_index, args=(previous,))
+            timer.daemon = True
+            timer.start()
+
+    def _drop_orphans(self):
+        """
+        Removes shadow collections left behind by interrupted builds. Builds
+        still running in another process hold their build lock and are kept,
+        as is whatever collection the pointer file names by now.
+        """
+        orphans = {name.split(SHARD_SEPARATOR)[0] for name in list_collection_names()
+                   if name.startswith(f"{COLLECTION_NAME}_")}
+        keep = {self.active["collection"], load_active_index()["collection"]}
+        for name in orphans - keep:
+            if is_build_locked(name):
+                print(f"⏳ Keeping {name}, another process is still building it")
+                continue
+            retire_index({"collection": name,
+                          "manifest": os.path.join(INDEX_DIR, f"{name}.manifest.json"),
+                          "bm25": os.path.join(INDEX_DIR, f"{name}.bm25.json"),
+                          "centroids": os.path.join(INDEX_DIR, f"{name}.centroids.json")})
+            if os.path.exists(_lock_path(name)):
+                os.remove(_lock_path(name))
+
+
+def open_active_index(store=None):
+    """
+    Search backend over the live index for processes that only read it, such
+    as batch.py. Unlike IndexManager.start this never builds, swaps or drops
+    collections, so it is safe to run next to the app.
+    """
+    info = load_active_index()
+    collection = open_collection(info)
+    if collection.count() == 0:
+        raise RuntimeError(f"Index {info['collection']} is empty; run vectorstore.py to build it")
+    print(f"📚 Reading collection {info['collection']}")
+    return get_search_backend(collection, store, bm25_path=info["bm25"], centroids_path=info.get("centroids"),
+                              version=info.get("version"))
+
+
+_index_manager = None
+_index_manager_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Returns the process-wide IndexManager"""
+    global _index_manager
+    if _index_manager is None:
+        with _index_manager_lock:
+            if _index_manager is None:
+                _index_manager = IndexManager()
+    return _index_manager
+
+
+def get_search_backend(collection, store=None, backend=None, bm25_path=lexical.BM25_INDEX_FILE, centroids_path=None,
+                       version=None):
+    """
+    Returns the vector backend selected by VECTOR_BACKEND for logic.search_query,
+    wrapped in a BM25 hybrid backend when HYBRID_SEARCH is on.
+
+    A ShardedCollection is searched through a routing.QueryRouter, using the
+    shard centroids saved at centroids_path. The FAISS index is built from the
+    vectors stored in the collection and saved next to it (see faiss_paths), so
+    it always matches the collection it was built from; it is one index over
+    all sources and is not routed.
+
+    Args:
+        version (str, optional): Data version of the collection from its
+            active-index record. Defaults to the store's current version.
+    """
+    dense = _get_dense_backend(collection, store, backend or backends.VECTOR_BACKEND, centroids_path, version)
+    if backends.HYBRID_SEARCH:
+        return backends.HybridBackend(dense, BM25Index.load(bm25_path))
+    return dense
+
+
+def faiss_paths(name):
+    """
+    FAISS index, sidecar and version file of a collection. A shadow build
+    never overwrites the files the live index may be memory-mapping; the
+    pre-versioning collection keeps the original data/faiss_* files.
+    """
+    if name == COLLECTION_NAME:
+        return {"index_path": backends.FAISS_INDEX_FILE, "metadata_path": backends.FAISS_METADATA_FILE,
+                "version_path": backends.FAISS_VERSION_FILE}
+    prefix = os.path.join(INDEX_DIR, f"{name}.faiss")
+    return {"index_path": f"{prefix}.idx", "metadata_path": f"{prefix}.json", "version_path": f"{prefix}.version"}
+
+
+def _get_dense_backend(collection, store, backend, centroids_path=None, version=None):
+    if backend == "chroma":
+        if isinstance(collection, ShardedCollection):
+            router = routing.QueryRouter(collection.shard_names(), routing.load_centroids(centroids_path))
+            return backends.ShardedBackend(collection, router)
+        return backends.ChromaBackend(collection)
+    if backend != "faiss":
+        raise ValueError(f"Unknown vector backend: {backend}")
+
+    store = docstore.get_docstore() if store is None else store
+    # Labelled with the collection it is built from, not with whatever the store holds now
+    version = f"{collection.name}:{version or store.version()}:{backends.FAISS_INDEX_TYPE}:{INDEX_LAYOUT}"
+    paths = faiss_paths(collection.name)
+    if backends.read_faiss_version(paths["version_path"]) == version:
+        print(f"📚 Loading FAISS {backends.FAISS_INDEX_TYPE} index of {collection.name}")
+        return backends.FaissBackend.load(paths["index_path"], paths["metadata_path"])
+
+    if collection.count():
+        print(f"💾 Building FAISS {backends.FAISS_INDEX_TYPE} index from the vectors of {collection.name}")
+        faiss_backend = backends.FaissBackend.from_vectors(
+            _iter_vectors(collection, INDEX_BATCH_SIZE),
+            backends.FAISS_INDEX_TYPE,
+            version=version,
+        )
+    else:
+        print(f"💾 Building FAISS {backends.FAISS_INDEX_TYPE} index")
+        faiss_backend = backends.FaissBackend.build(
+            ((chunk["id"], chunk["text"], chunk["metadata"]) for chunk in store.iter_chunks()),
+            lambda texts: embeddings.encode(texts, normalize=True, show_progress_bar=False),
+            version=version,
+            batch_size=INDEX_BATCH_SIZE,
+        )
+    faiss_backend.save(**paths)
+    return faiss_backend
+
+
+def _iter_vectors(collection, batch_size):
+    """Pages of ((chunk_id, text, metadata) list, embeddings) over a collection's stored vectors"""
+    offset = 0
+    total = collection.count()
+    while offset < total:
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        yield list(zip(batch["ids"], batch["documents"], batch["metadatas"])), batch["embeddings"]
+        offset += len(batch["ids"])
+
+
+if __name__ == "__main__":
+    # Blocking re-index, e.g. right after ingest.py
+    manager = get_index_manager().start()
+    manager.wait()
+    print(f"✅ Live index: {manager.status()}")